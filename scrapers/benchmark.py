@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Scraper Benchmarks
+Times PDF extraction, HTML sectioning, requirement parsing, JSON serialization and
+compression offline against the guideline files committed in guidelines/, and reports
+the results as JSON
+"""
+
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import contextlib
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pdf_text
+from pdf_text import write_pages, extractor_version
+from guideline_pipeline import Extracted
+from guideline_store import save_guidelines, export_index, load_index, load_guidelines
+from guideline_parser import matcher_for
+import guideline_json
+import guideline_compress
+import html_text
+from fha_scraper import FHAScraper
+from va_scraper import VAScraper
+from fannie_mae_scraper import FannieMaeScraper
+from run_all_scrapers import write_combined, combined_entry, combined_requirements
+
+# Committed inputs
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "guidelines"
+CORPUS_PDFS = [
+    "va_lenders_handbook.pdf",
+    "va_m26_1_manual.pdf",
+    "va_credit_underwriting.pdf",
+    "fannie_mae_selling_guide.pdf",
+]
+
+# Benchmark result format - bump when metrics are renamed or change meaning
+BENCHMARK_VERSION = 1
+
+# JSON writers compared by bench_json - (backend, pretty); None is the
+# json.dump(indent=2, ensure_ascii=False) the scrapers used before guideline_json
+JSON_VARIANTS = {
+    "stdlib_indent2": None,
+    "json_compact": ("json", False),
+    "orjson_compact": ("orjson", False),
+    "orjson_pretty": ("orjson", True),
+}
+
+
+def _corpus_sources():
+    """(scraper class, extracted documents) for each agency with committed text"""
+    sources = [
+        (FHAScraper, [Extracted("handbook", None, None, CORPUS_DIR / "fha_handbook_4000.1.txt", None, [])]),
+        (VAScraper, [
+            Extracted(document.name, document.urls[0], None,
+                      CORPUS_DIR / Path(document.filename).with_suffix('.txt'), None, [])
+            for document in VAScraper.documents
+        ]),
+    ]
+    
+    # The Fannie Mae pages are only committed as the text the scraper joined -
+    # inline in older files, in shards (maybe compressed) once re-scraped
+    fannie_text = load_guidelines(CORPUS_DIR / "fannie_mae_guidelines.json")["full_text"]
+    if not isinstance(fannie_text, str):
+        fannie_text = fannie_text[:]
+    sources.append((FannieMaeScraper, [Extracted("selling_guide", None, None, None, fannie_text, [])]))
+    return sources
+
+
+def _quiet(func, *args, **kwargs):
+    """Call func with its progress output swallowed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def _timed(func, repeat):
+    """(best, median) wall-clock seconds of repeat calls, plus the last result"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times), result
+
+
+def _rate(amount, seconds):
+    return round(amount / seconds, 2) if seconds > 0 else None
+
+
+def _text_bytes(extracted):
+    total = 0
+    for document in extracted:
+        if document.text_file:
+            total += document.text_file.stat().st_size
+        else:
+            total += len(document.text.encode('utf-8'))
+    return total
+
+
+def bench_extract(work_dir, jobs=1):
+    """Pages per second of PDF text extraction, with the page cache off"""
+    pdf_text.configure_extraction(jobs=jobs, cache=False)
+    results = {}
+    for name in CORPUS_PDFS:
+        pdf_path = CORPUS_DIR / name
+        if not pdf_path.exists():
+            continue
+        text_file = work_dir / Path(name).with_suffix('.txt')
+        started = time.perf_counter()
+        _quiet(write_pages, pdf_path, text_file, progress_every=10 ** 9)
+        seconds = time.perf_counter() - started
+        with guideline_compress.open_text(text_file) as f:
+            pages = f.read().count("\n--- PAGE ")
+        results[name] = {
+            "pages": pages,
+            "seconds": round(seconds, 4),
+            "pages_per_sec": _rate(pages, seconds)
+        }
+    return results
+
+
+def _guide_page(headings, paragraphs=8):
+    """Synthetic guide chapter - h1-h4 headings, each followed by paragraphs and a list"""
+    parts = []
+    for number in range(headings):
+        level = 1 + number % 4
+        parts.append(f"<h{level}>Section {number}</h{level}>")
+        parts.extend(f"<p>Paragraph {line} of section {number}: the lender must document "
+                     f"<b>stable</b> income for the most recent two years.</p>" for line in range(paragraphs))
+        parts.append("<ul><li>Requirement one</li><li>Requirement two</li></ul>")
+    return f"<html><head><title>Guide</title></head><body><main>{''.join(parts)}</main></body></html>".encode('utf-8')
+
+
+def bench_html(repeat=3, headings=(50, 500)):
+    """extract_page time per parser on guide chapters of different lengths"""
+    saved = html_text.html_options()
+    results = {}
+    try:
+        for count in headings:
+            page = _guide_page(count)
+            for parser in html_text.HTML_PARSERS:
+                if parser == "lxml" and not html_text.lxml_available():
+                    continue
+                html_text.configure_html(parser=parser)
+                best, _, (_, _, sections) = _timed(lambda: html_text.extract_page(page), repeat)
+                results[f"{parser}_{count}_headings"] = {
+                    "bytes": len(page),
+                    "sections": len(sections),
+                    "seconds": round(best, 4),
+                    "mb_per_sec": _rate(len(page) / 1e6, best)
+                }
+    finally:
+        html_text.configure_html(**saved)
+    return results
+
+
+def bench_parse(work_dir, repeat=3):
+    """Full and incremental parse_guidelines throughput per agency
+    
+    Also returns each agency's guidelines from the last full parse, for
+    the serialization benchmark.
+    """
+    results = {}
+    parsed = {}
+    for scraper_class, extracted in _corpus_sources():
+        data_dir = work_dir / scraper_class.key
+        shutil.rmtree(data_dir, ignore_errors=True)
+        scraper = scraper_class(data_dir=str(data_dir))
+        size = _text_bytes(extracted)
+        
+        def full():
+            for stale in (scraper.json_file, scraper.page_index_file):
+                if stale.exists():
+                    stale.unlink()
+            return _quiet(scraper.parse_guidelines, extracted)
+        
+        best, median, guidelines = _timed(full, repeat)
+        matches = sum(len(guidelines[category]) for category in scraper.category_patterns)
+        matcher = matcher_for(scraper.category_patterns)
+        
+        # Unchanged text against a saved previous run - page hashing and carry-over only
+        _quiet(save_guidelines, guidelines, scraper.json_file)
+        incremental_best, incremental_median, _ = _timed(
+            lambda: _quiet(scraper.parse_guidelines, extracted, incremental=True), repeat)
+        
+        results[scraper_class.key] = {
+            "bytes": size,
+            "matches": matches,
+            "passages": len(guidelines["passages"]),
+            # Passes over the text: the prefiltered scan against one finditer per pattern
+            "text_passes": matcher.passes,
+            "per_pattern_passes": len(matcher.entries),
+            "full": {
+                "seconds": round(best, 4),
+                "median_seconds": round(median, 4),
+                "mb_per_sec": _rate(size / 1e6, best),
+                "matches_per_sec": _rate(matches, best)
+            },
+            "incremental": {
+                "seconds": round(incremental_best, 4),
+                "median_seconds": round(incremental_median, 4),
+                "mb_per_sec": _rate(size / 1e6, incremental_best)
+            }
+        }
+        parsed[scraper_class.key] = (scraper, guidelines)
+    return results, parsed
+
+
+def bench_serialize(work_dir, parsed, repeat=3):
+    """save_guidelines, export_index and combined-file throughput"""
+    results = {}
+    for key, (scraper, guidelines) in parsed.items():
+        # The text shards were streamed out while parsing - this is the JSON index
+        best, median, _ = _timed(lambda: save_guidelines(guidelines, scraper.json_file), repeat)
+        written = scraper.json_file.stat().st_size
+        export_best, _, exported = _timed(lambda: export_index(scraper.json_file), repeat)
+        results[key] = {
+            "save_seconds": round(best, 4),
+            "save_median_seconds": round(median, 4),
+            "index_bytes": written,
+            "save_mb_per_sec": _rate(written / 1e6, best),
+            "export_seconds": round(export_best, 4),
+            "export_records": sum(len(value) for value in exported.values() if isinstance(value, list))
+        }
+    
+    combined_file = work_dir / "combined_guidelines.json"
+    sources = [(key, scraper.json_file) for key, (scraper, _) in parsed.items()]
+    metadata = {"created_at": datetime.now().isoformat(), "version": "2.0",
+                "sources": list(parsed), "total_sources": len(parsed), "errors": []}
+    best, median, _ = _timed(lambda: write_combined(combined_file, metadata, sources), repeat)
+    size = combined_file.stat().st_size
+    results["combined"] = {
+        "seconds": round(best, 4),
+        "median_seconds": round(median, 4),
+        "bytes": size,
+        "mb_per_sec": _rate(size / 1e6, best)
+    }
+    return results
+
+
+def bench_json(parsed, repeat=3):
+    """Dump and load throughput of each JSON writer over the agency indexes and combined file"""
+    documents = [load_index(scraper.json_file) for scraper, _ in parsed.values()]
+    sources = [(key, scraper.json_file) for key, (scraper, _) in parsed.items()]
+    documents.append({"metadata": {}, "guidelines": {key: combined_entry(path) for key, path in sources}})
+    saved = guideline_json.serializer_options()
+    
+    results = {}
+    try:
+        for name, variant in JSON_VARIANTS.items():
+            if variant is None:
+                def dump_all():
+                    return [json.dumps(document, indent=2, ensure_ascii=False).encode('utf-8')
+                            for document in documents]
+                
+                def load_all(dumped):
+                    return [json.loads(data) for data in dumped]
+            else:
+                backend, pretty = variant
+                if backend == "orjson" and guideline_json.orjson is None:
+                    continue
+                guideline_json.configure_serializer(backend=backend, pretty=pretty)
+                
+                def dump_all():
+                    return [guideline_json.dumps(document) for document in documents]
+                
+                def load_all(dumped):
+                    return [guideline_json.loads(data) for data in dumped]
+            
+            dump_best, _, dumped = _timed(dump_all, repeat)
+            load_best, _, _ = _timed(lambda: load_all(dumped), repeat)
+            size = sum(len(data) for data in dumped)
+            results[name] = {
+                "bytes": size,
+                "dump_seconds": round(dump_best, 4),
+                "load_seconds": round(load_best, 4),
+                "dump_mb_per_sec": _rate(size / 1e6, dump_best),
+                "load_mb_per_sec": _rate(size / 1e6, load_best)
+            }
+        
+        # Requirement records as NDJSON, read back one line at a time
+        guideline_json.configure_serializer(**saved)
+        with tempfile.TemporaryDirectory(prefix="guideline-bench-") as scratch:
+            ndjson_file = Path(scratch) / "requirements.ndjson"
+            dump_best, _, count = _timed(
+                lambda: guideline_json.save_ndjson(combined_requirements(sources), ndjson_file), repeat)
+            load_best, _, _ = _timed(lambda: sum(1 for _ in guideline_json.iter_ndjson(ndjson_file)), repeat)
+            results["ndjson_requirements"] = {
+                "records": count,
+                "bytes": ndjson_file.stat().st_size,
+                "dump_seconds": round(dump_best, 4),
+                "load_seconds": round(load_best, 4),
+                "load_records_per_sec": _rate(count, load_best)
+            }
+    finally:
+        guideline_json.configure_serializer(**saved)
+    return results
+
+
+def _copy_stream(source, target):
+    """Copy one binary stream to another in 1 MB pieces; returns the bytes copied"""
+    total = 0
+    for chunk in iter(lambda: source.read(1 << 20), b""):
+        target.write(chunk)
+        total += len(chunk)
+    return total
+
+
+def bench_compression(parsed, repeat=3):
+    """Size and streaming write/read throughput of the text and JSON artifacts per codec
+    
+    The artifacts are the committed extracted text and each agency's
+    index and text shards. Reads stream through guideline_compress the
+    way the parse stage and TextShards read them.
+    """
+    artifacts = [document.text_file for _, extracted in _corpus_sources()
+                 for document in extracted if document.text_file]
+    for scraper, _ in parsed.values():
+        artifacts.append(scraper.json_file)
+        artifacts.extend(scraper.data_dir / shard["file"] for shard in load_index(scraper.json_file)["text"]["shards"])
+    plain_bytes = sum(path.stat().st_size for path in artifacts)
+    saved = guideline_compress.compression_options()
+    
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="guideline-bench-") as scratch:
+            for codec in [None] + guideline_compress.CODECS:
+                if codec == "zstd" and guideline_compress.zstandard is None:
+                    continue
+                guideline_compress.configure_compression(codec=codec, level=None)
+                copies = [Path(scratch) / f"{number}.{path.name}" for number, path in enumerate(artifacts)]
+                
+                def write_all():
+                    for path, copy in zip(artifacts, copies):
+                        with open(path, 'rb') as source, guideline_compress.open_write(copy) as target:
+                            _copy_stream(source, target)
+                
+                def read_all():
+                    for copy in copies:
+                        with guideline_compress.open_read(copy) as source:
+                            while source.read(1 << 20):
+                                pass
+                
+                write_best, _, _ = _timed(write_all, repeat)
+                read_best, _, _ = _timed(read_all, repeat)
+                size = sum(copy.stat().st_size for copy in copies)
+                results[codec or "none"] = {
+                    "bytes": size,
+                    "ratio": round(plain_bytes / size, 2) if size else None,
+                    "write_seconds": round(write_best, 4),
+                    "read_seconds": round(read_best, 4),
+                    "write_mb_per_sec": _rate(plain_bytes / 1e6, write_best),
+                    "read_mb_per_sec": _rate(plain_bytes / 1e6, read_best)
+                }
+    finally:
+        guideline_compress.configure_compression(**saved)
+    return results
+
+
+def environment():
+    """Where the benchmark ran - results are only comparable on like machines"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CORPUS_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.machine(),
+        "extractor": extractor_version(),
+        "json_backend": guideline_json.serializer_options()["backend"],
+        "zstandard": getattr(guideline_compress.zstandard, "__version__", None),
+        "html_parser": html_text.html_options()["parser"],
+        "commit": commit
+    }
+
+
+def run_benchmarks(extract=True, extract_jobs=1, repeat=3):
+    """Run every benchmark in a scratch directory and return the results"""
+    work_dir = Path(tempfile.mkdtemp(prefix="guideline-bench-"))
+    try:
+        results = {
+            "benchmark_version": BENCHMARK_VERSION,
+            "created_at": datetime.now().isoformat(),
+            "environment": environment(),
+            "repeat": repeat
+        }
+        if extract:
+            results["extract"] = bench_extract(work_dir, jobs=extract_jobs)
+        results["html"] = bench_html(repeat=repeat)
+        results["parse"], parsed = bench_parse(work_dir, repeat=repeat)
+        results["serialize"] = bench_serialize(work_dir, parsed, repeat=repeat)
+        results["json"] = bench_json(parsed, repeat=repeat)
+        results["compression"] = bench_compression(parsed, repeat=repeat)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _throughputs(results, prefix=""):
+    """{dotted path: value} of every rate and timing in a result tree"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_throughputs(value, path + "."))
+        elif isinstance(value, (int, float)) and (key.endswith("_per_sec") or key.endswith("seconds")):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline, results, threshold=0.10):
+    """Print how each metric moved against a baseline run; returns the regressions"""
+    sections = ("extract", "html", "parse", "serialize", "json", "compression")
+    old = _throughputs({key: baseline.get(key, {}) for key in sections})
+    new = _throughputs({key: results.get(key, {}) for key in sections})
+    regressions = []
+    print(f"{'metric':60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for path in sorted(set(old) & set(new)):
+        if not old[path]:
+            continue
+        change = (new[path] - old[path]) / old[path]
+        # Higher is better for rates, lower is better for timings
+        worse = change < -threshold if path.endswith("_per_sec") else change > threshold
+        if worse:
+            regressions.append(path)
+        print(f"{path:60} {old[path]:>12} {new[path]:>12} {change:>+7.1%}{' !' if worse else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark guideline extraction, parsing and serialization")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write the results JSON here instead of stdout")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N",
+                        help="runs per parse/serialize benchmark; the best is reported (default: 3)")
+    parser.add_argument("--skip-extract", action="store_true",
+                        help="skip PDF extraction, the slowest benchmark")
+    parser.add_argument("--extract-jobs", type=int, default=1, metavar="N",
+                        help="extract PDF pages with N worker processes (0 = one per CPU core)")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="baseline results JSON to compare against; exits 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression with --compare (default: 0.10)")
+    args = parser.parse_args()
+    
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    
+    results = run_benchmarks(extract=not args.skip_extract, extract_jobs=args.extract_jobs,
+                             repeat=args.repeat)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results saved to {args.output}")
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, threshold=args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Guideline Compression
+Optional zstd or gzip compression of the text and JSON files the scrapers write.
+Files keep their names - readers recognise a compressed file by its leading bytes,
+so compressed and plain files can sit side by side and are read the same way
+"""
+
+import io
+import gzip
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd needs the zstandard package; gzip is always available
+CODECS = ["zstd", "gzip"]
+
+# Levels used when none is configured - compression runs once per update,
+# decompression speed does not depend on the level
+DEFAULT_LEVELS = {"zstd": 10, "gzip": 6}
+
+# Leading bytes of each codec's files
+MAGIC = {"zstd": b"\x28\xb5\x2f\xfd", "gzip": b"\x1f\x8b"}
+
+# codec None writes plain files
+_options = {"codec": None, "level": None}
+
+
+def configure_compression(**options):
+    """Set the codec ("zstd", "gzip" or None) and level new files are written with"""
+    if options.get("codec") == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package")
+    _options.update(options)
+
+
+def compression_options():
+    """Current settings, for passing to worker processes"""
+    return dict(_options)
+
+
+def _level(codec):
+    return _options["level"] if _options["level"] is not None else DEFAULT_LEVELS[codec]
+
+
+def codec_of(data):
+    """Codec whose magic bytes data starts with, or None for a plain file"""
+    for codec, magic in MAGIC.items():
+        if data[:len(magic)] == magic:
+            return codec
+    return None
+
+
+def _zstd():
+    if zstandard is None:
+        raise ValueError("file is zstd-compressed but the zstandard package is not installed")
+    return zstandard
+
+
+class _GzipFile(gzip.GzipFile):
+    """GzipFile over an open file, closing it too unless closefd is False
+    
+    No file name or timestamp goes into the header, so the same content
+    always compresses to the same bytes.
+    """
+    
+    def __init__(self, raw, mode, closefd=True, **kwargs):
+        super().__init__(filename="", mode=mode, fileobj=raw, mtime=0, **kwargs)
+        self.raw_file = raw if closefd else None
+    
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.raw_file is not None:
+                self.raw_file.close()
+
+
+def _writer(raw, closefd):
+    """Binary stream compressing into the open file raw with the configured codec"""
+    codec = _options["codec"]
+    if codec == "gzip":
+        return _GzipFile(raw, 'wb', closefd=closefd, compresslevel=_level(codec))
+    if codec == "zstd":
+        compressor = _zstd().ZstdCompressor(level=_level(codec))
+        return io.BufferedWriter(compressor.stream_writer(raw, closefd=closefd, write_return_read=True))
+    return raw
+
+
+def open_write(path):
+    """Binary file for writing path, compressed with the configured codec"""
+    return _writer(open(path, 'wb'), closefd=True)
+
+
+@contextmanager
+def compressing(raw):
+    """Compress what is written to the yielded stream into raw, an open binary file
+    
+    raw stays open, so it can be flushed and fsynced once the compressed
+    stream has been finished.
+    """
+    stream = _writer(raw, closefd=False)
+    try:
+        yield stream
+    finally:
+        if stream is not raw:
+            stream.close()
+
+
+def open_read(path):
+    """Binary file reading path, decompressed as it is read if it is compressed"""
+    raw = open(path, 'rb')
+    try:
+        codec = codec_of(raw.peek(4))
+        if codec == "gzip":
+            return _GzipFile(raw, 'rb')
+        if codec == "zstd":
+            reader = _zstd().ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+            return io.BufferedReader(reader)
+    except Exception:
+        raw.close()
+        raise
+    return raw
+
+
+def open_text(path, mode='r', newline=None):
+    """UTF-8 text file over open_read or open_write"""
+    stream = open_write(path) if mode == 'w' else open_read(path)
+    return io.TextIOWrapper(stream, encoding='utf-8', newline=newline)
+
+
+def compress(data):
+    """data compressed with the configured codec, or unchanged if compression is off"""
+    codec = _options["codec"]
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=_level(codec), mtime=0)
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=_level(codec)).compress(data)
+    return data
+
+
+def decompress(data):
+    """Contents of data, which may be compressed with any codec"""
+    codec = codec_of(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        with _zstd().ZstdDecompressor().stream_reader(data, read_across_frames=True) as reader:
+            return reader.read()
+    return data
+
+
+def read_bytes(path):
+    """Contents of a file, decompressed"""
+    with open(path, 'rb') as f:
+        return decompress(f.read())
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Guideline Database
+Local SQLite copy of the scraped guidelines - sources, documents, pages and
+requirement passages, with an FTS5 full-text index over passage text
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import bisect
+import hashlib
+import sqlite3
+from datetime import datetime
+from guideline_parser import split_pages, iter_match_starts, iter_requirements, passage_text, requirement_keyword
+from guideline_store import load_guidelines
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    name TEXT,
+    last_updated TEXT,
+    signature TEXT,
+    built_at TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    position INTEGER NOT NULL,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    document_id INTEGER REFERENCES documents(id),
+    segment INTEGER NOT NULL,
+    page_number INTEGER,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    page_id INTEGER REFERENCES pages(id),
+    start INTEGER,
+    end INTEGER,
+    categories TEXT NOT NULL,
+    keywords TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS passage_categories (
+    passage_id INTEGER NOT NULL REFERENCES passages(id),
+    category TEXT NOT NULL,
+    PRIMARY KEY (passage_id, category)
+);
+CREATE INDEX IF NOT EXISTS documents_source ON documents(source_id);
+CREATE INDEX IF NOT EXISTS pages_source ON pages(source_id, segment);
+CREATE INDEX IF NOT EXISTS passages_source ON passages(source_id);
+CREATE INDEX IF NOT EXISTS passage_categories_category ON passage_categories(category);
+CREATE VIRTUAL TABLE IF NOT EXISTS passage_fts USING fts5(
+    text, keywords, tokenize = 'porter unicode61'
+);
+"""
+
+# Document separators used when scrapers join several documents into full_text
+DOCUMENT_BOUNDARY = re.compile(r"\n\n=== DOCUMENT SEPARATOR ===\n\n|\n=== [^\n]* ===\n")
+
+PAGE_NUMBER = re.compile(r"\n--- PAGE (\d+) ---\n")
+
+# BM25 weight of a passage's matched keywords relative to its text
+KEYWORD_WEIGHT = 2.0
+
+# Words in queries built from file names and loan types that carry no signal
+IGNORED_TERMS = {
+    "pdf", "jpg", "jpeg", "png", "tif", "tiff", "doc", "docx", "txt", "scan", "copy", "final",
+    "the", "and", "for", "of", "to", "in", "on", "with", "loan",
+}
+
+
+def connect(db_path):
+    """Open the guideline database, creating the schema if needed"""
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def file_signature(json_file):
+    """SHA256 of an agency index - changes whenever the scraper rewrites it"""
+    return hashlib.sha256(json_file.read_bytes()).hexdigest()
+
+
+def _delete_source(conn, source_id):
+    """Remove every row belonging to one source"""
+    passage_ids = "SELECT id FROM passages WHERE source_id = ?"
+    conn.execute(f"DELETE FROM passage_fts WHERE rowid IN ({passage_ids})", (source_id,))
+    conn.execute(f"DELETE FROM passage_categories WHERE passage_id IN ({passage_ids})", (source_id,))
+    conn.execute("DELETE FROM passages WHERE source_id = ?", (source_id,))
+    conn.execute("DELETE FROM pages WHERE source_id = ?", (source_id,))
+    conn.execute("DELETE FROM documents WHERE source_id = ?", (source_id,))
+
+
+def _insert_passage(conn, source_id, page_id, start, end, categories, keywords, text):
+    cursor = conn.execute(
+        "INSERT INTO passages (source_id, page_id, start, end, categories, keywords) VALUES (?, ?, ?, ?, ?, ?)",
+        (source_id, page_id, start, end, json.dumps(categories), json.dumps(keywords, ensure_ascii=False))
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO passage_categories (passage_id, category) VALUES (?, ?)",
+        [(cursor.lastrowid, category) for category in categories]
+    )
+    conn.execute(
+        "INSERT INTO passage_fts (rowid, text, keywords) VALUES (?, ?, ?)",
+        (cursor.lastrowid, text, " ".join(keywords))
+    )
+
+
+def _load_source(conn, key, name, guidelines, signature):
+    """Replace one source's rows with the contents of its guidelines"""
+    row = conn.execute("SELECT id FROM sources WHERE key = ?", (key,)).fetchone()
+    if row:
+        source_id = row[0]
+        _delete_source(conn, source_id)
+        conn.execute(
+            "UPDATE sources SET name = ?, last_updated = ?, signature = ?, built_at = ? WHERE id = ?",
+            (name, guidelines.get("last_updated"), signature, datetime.now().isoformat(), source_id)
+        )
+    else:
+        source_id = conn.execute(
+            "INSERT INTO sources (key, name, last_updated, signature, built_at) VALUES (?, ?, ?, ?, ?)",
+            (key, name, guidelines.get("last_updated"), signature, datetime.now().isoformat())
+        ).lastrowid
+    
+    text = guidelines.get("full_text", "")
+    
+    # Documents in the order the scraper joined them
+    document_starts = [0] + [start for start in iter_match_starts(text, DOCUMENT_BOUNDARY) if start > 0]
+    names = guidelines.get("documents") or guidelines.get("urls_scraped") or []
+    if len(names) != len(document_starts):
+        names = [guidelines.get("source", name)] if len(document_starts) == 1 else [
+            f"document {i + 1}" for i in range(len(document_starts))
+        ]
+    document_ids = [
+        conn.execute(
+            "INSERT INTO documents (source_id, position, name) VALUES (?, ?, ?)",
+            (source_id, position, document_name)
+        ).lastrowid
+        for position, document_name in enumerate(names)
+    ]
+    
+    page_ids = []
+    for segment, (start, end) in enumerate(split_pages(text)):
+        page_text = text[start:end]
+        number = PAGE_NUMBER.match(page_text)
+        document_id = document_ids[bisect.bisect_right(document_starts, start) - 1] if document_ids else None
+        page_ids.append(conn.execute(
+            "INSERT INTO pages (source_id, document_id, segment, page_number, start, end, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source_id, document_id, segment, int(number.group(1)) if number else None, start, end, page_text)
+        ).lastrowid)
+    
+    if "passages" in guidelines:
+        for passage in guidelines["passages"]:
+            keywords = []
+            for keyword in passage["keywords"]:
+                word = requirement_keyword(text, keyword)
+                if word not in keywords:
+                    keywords.append(word)
+            page_id = page_ids[passage["page"]] if passage["page"] < len(page_ids) else None
+            _insert_passage(conn, source_id, page_id, passage["start"], passage["end"],
+                            passage["categories"], keywords, passage_text(text, passage))
+    else:
+        # Files from before passages were coalesced - one passage per record
+        for category, value in guidelines.items():
+            if not isinstance(value, list) or not value or not isinstance(value[0], dict) or "context" not in value[0]:
+                continue
+            for record in iter_requirements(guidelines, category):
+                _insert_passage(conn, source_id, None, None, None, [category], [record["keyword"]], record["context"])
+    
+    return source_id
+
+
+def build_database(db_path, sources, force=False):
+    """Bring the database up to date with each source's agency file
+    
+    sources is a list of (key, name, json_file). A source whose file is
+    unchanged since the last build is skipped, so refreshing one agency
+    leaves the others' rows alone. Each source is replaced in its own
+    transaction. Returns the keys that were rebuilt.
+    """
+    conn = connect(db_path)
+    rebuilt = []
+    try:
+        for key, name, json_file in sources:
+            if not json_file.exists():
+                continue
+            signature = file_signature(json_file)
+            row = conn.execute("SELECT signature FROM sources WHERE key = ?", (key,)).fetchone()
+            if row and row[0] == signature and not force:
+                print(f"  - {name}: unchanged")
+                continue
+            
+            guidelines = load_guidelines(json_file)
+            with conn:
+                _load_source(conn, key, name, guidelines, signature)
+            rebuilt.append(key)
+            print(f"  - {name}: rebuilt")
+    finally:
+        conn.close()
+    return rebuilt
+
+
+def query_terms(text):
+    """Distinct search words of free text, e.g. document names plus a loan type
+    
+    File extensions, bare numbers and common filler words are dropped so
+    that 'W2_2023.pdf' searches for 'w2' only.
+    """
+    terms = []
+    for word in re.findall(r"[A-Za-z0-9]+", text.lower()):
+        if len(word) < 2 or word.isdigit() or word in IGNORED_TERMS:
+            continue
+        if word not in terms:
+            terms.append(word)
+    return terms
+
+
+def fts_query(text, match_all=True):
+    """FTS5 query for free text - every word required, or any word with match_all=False"""
+    return (" " if match_all else " OR ").join(f'"{word}"' for word in query_terms(text))
+
+
+def search_passages(db_path, query, source=None, category=None, limit=10, match_all=True):
+    """Passages matching query, best BM25 score first
+    
+    With match_all every query word must appear. Otherwise any word may,
+    and passages matching more and rarer words rank higher - the mode used
+    to pick prompt context. Returns dicts with the source key, page
+    number, categories, keywords, passage text and score.
+    """
+    match = fts_query(query, match_all)
+    if not match:
+        return []
+    
+    sql = f"""
+        SELECT s.key, pg.page_number, p.categories, p.keywords, passage_fts.text,
+               bm25(passage_fts, 1.0, {KEYWORD_WEIGHT}) AS score
+        FROM passage_fts
+        JOIN passages p ON p.id = passage_fts.rowid
+        JOIN sources s ON s.id = p.source_id
+        LEFT JOIN pages pg ON pg.id = p.page_id
+        WHERE passage_fts MATCH ?
+    """
+    params = [match]
+    if source:
+        sql += " AND s.key = ?"
+        params.append(source)
+    if category:
+        sql += " AND p.id IN (SELECT passage_id FROM passage_categories WHERE category = ?)"
+        params.append(category)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+    
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return [
+            {
+                "source": key,
+                "page": page_number,
+                "categories": json.loads(categories),
+                "keywords": json.loads(keywords),
+                "text": text,
+                "score": round(-score, 4)
+            }
+            for key, page_number, categories, keywords, text, score in conn.execute(sql, params)
+        ]
+    finally:
+        conn.close()
+
+
+def serve(db_path, stdin=sys.stdin, stdout=sys.stdout):
+    """Answer JSON search requests, one per line, until stdin closes
+    
+    Each request is {"query", "source", "category", "k"}; each reply is
+    {"passages": [...], "elapsed_ms": n} or {"error": message}. Replies
+    are written in request order, one line each.
+    """
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            started = time.perf_counter()
+            passages = search_passages(db_path, request.get("query", ""), source=request.get("source"),
+                                       category=request.get("category"), limit=int(request.get("k", 10)),
+                                       match_all=False)
+            reply = {"passages": passages, "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+        except (ValueError, TypeError, AttributeError, sqlite3.Error) as e:
+            reply = {"error": str(e)}
+        stdout.write(json.dumps(reply, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the scraped guideline database")
+    parser.add_argument("--db", default="../guidelines/guidelines.db",
+                        help="Path to guidelines.db (default: ../guidelines/guidelines.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    search = commands.add_parser("search", help="Print the top passages for a query as JSON")
+    search.add_argument("query", help="Free text, e.g. document names plus the loan type")
+    search.add_argument("--source", help="Agency key, e.g. fha or fannie_mae")
+    search.add_argument("--category", help="Requirement category, e.g. income_requirements")
+    search.add_argument("-k", type=int, default=10, help="Number of passages to return (default: 10)")
+    search.add_argument("--all", action="store_true", help="Require every query word to appear")
+    
+    commands.add_parser("serve", help="Answer JSON requests read line by line from stdin")
+    
+    args = parser.parse_args()
+    if args.command == "search":
+        results = search_passages(args.db, args.query, source=args.source, category=args.category,
+                                  limit=args.k, match_all=args.all)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        serve(args.db)
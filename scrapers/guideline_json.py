@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Guideline JSON
+Reads and writes the scrapers' JSON files - with orjson when it is installed, else the
+standard library - compact by default, indented when pretty output is turned on,
+plus NDJSON for record lists that are read one line at a time. Files are compressed
+when guideline_compress is configured to, and read back either way
+"""
+
+import os
+import json
+from pathlib import Path
+import guideline_compress
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "orjson" is used when installed; "json" forces the standard library
+BACKENDS = ["orjson", "json"]
+
+_options = {"backend": "orjson" if orjson else "json", "pretty": False}
+
+
+def configure_serializer(**options):
+    """Set the backend ("orjson" or "json") and pretty (indented output, for debugging)"""
+    if options.get("backend") == "orjson" and orjson is None:
+        raise ValueError("orjson is not installed")
+    _options.update(options)
+
+
+def serializer_options():
+    """Current settings, for passing to worker processes"""
+    return dict(_options)
+
+
+def pretty_enabled():
+    return _options["pretty"]
+
+
+def dumps(value, pretty=None):
+    """value as JSON bytes - UTF-8, not ASCII-escaped, indented by 2 if pretty
+    
+    Values orjson cannot encode (lone surrogates, integers over 64 bits)
+    fall back to the standard library.
+    """
+    pretty = _options["pretty"] if pretty is None else pretty
+    if _options["backend"] == "orjson":
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0))
+        except TypeError:
+            pass
+    if pretty:
+        text = json.dumps(value, indent=2, ensure_ascii=False)
+    else:
+        text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return text.encode('utf-8', 'surrogatepass')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if _options["backend"] == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN, Infinity and lone surrogates are only accepted by json
+            pass
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8', 'surrogatepass')
+    return json.loads(data)
+
+
+def load(path):
+    """Parse a JSON file, decompressing it if it is compressed"""
+    return loads(guideline_compress.read_bytes(path))
+
+
+def save(value, path, pretty=None):
+    """Write value to a JSON file, compressed if compression is on
+    
+    The file is written under a temporary name and renamed over path, so
+    readers see the old contents or the new, never a partial write.
+    """
+    path = Path(path)
+    temp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(guideline_compress.compress(dumps(value, pretty=pretty) + b"\n"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+
+
+def save_ndjson(records, path):
+    """Write each record as one compact JSON line; returns the number written"""
+    count = 0
+    with guideline_compress.open_write(path) as f:
+        for record in records:
+            f.write(dumps(record, pretty=False))
+            f.write(b"\n")
+            count += 1
+    return count
+
+
+def iter_ndjson(path):
+    """Yield the records of an NDJSON file one line at a time"""
+    with guideline_compress.open_read(path) as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
@@ -0,0 +1,745 @@
+#!/usr/bin/env python3
+"""
+Guideline Parser
+Regex requirement extraction shared by all scrapers, with incremental reparse,
+passage coalescing and a change log between guideline versions
+"""
+
+import re
+import json
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+import bisect
+import hashlib
+import difflib
+from collections import Counter
+from datetime import datetime
+import guideline_json
+from guideline_store import load_guidelines, ShardedText
+
+# Characters of surrounding text kept on each side of a keyword match
+CONTEXT_WINDOW = 500
+
+# Longest keyword match expected - lets a reparse window see matches that
+# start inside it but end past it
+MAX_MATCH_LENGTH = 200
+
+# Longest a coalesced passage grows - passages are pasted into prompts, so a
+# run of back-to-back matches is split into several instead of one long one
+MAX_PASSAGE_CHARS = 4 * CONTEXT_WINDOW
+
+# Characters kept either side of a streamed chunk - covers a match or page
+# marker straddling two chunks, and the text a lookbehind may inspect
+STREAM_OVERLAP = MAX_MATCH_LENGTH
+
+# Characters fed to the stream parser at a time
+STREAM_CHUNK = 1 << 16
+
+# Page markers and document headings that split text into pages
+PAGE_BOUNDARY = re.compile(
+    r"\n--- PAGE \d+ ---\n|\n\n=== DOCUMENT SEPARATOR ===\n\n|\n=== [^\n]* ===\n"
+)
+
+# Characters that re.IGNORECASE treats as ASCII letters but str.lower() does not
+CASE_FOLDS = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+INDEX_VERSION = 2
+
+# Value of "requirement_format" in guideline JSON whose requirement entries
+# are {start, end, page} spans into full_text rather than copied strings
+REQUIREMENT_FORMAT = "spans"
+
+
+def iter_chunks(text, size=STREAM_CHUNK):
+    """Consecutive pieces of a str or ShardedText, at most size characters each"""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def iter_match_starts(text, pattern, size=STREAM_CHUNK):
+    """Start offsets of pattern's matches in a str or ShardedText, as finditer gives them
+    
+    A ShardedText is read size characters at a time, with STREAM_OVERLAP
+    characters carried over so a match split between two pieces is still
+    found. Matches are assumed to be shorter than STREAM_OVERLAP.
+    """
+    if isinstance(text, str):
+        for match in pattern.finditer(text):
+            yield match.start()
+        return
+    
+    buffer = ""
+    base = resume = 0
+    for piece in iter_chunks(text, size):
+        buffer += piece
+        end = base + len(buffer)
+        safe_end = end if end >= len(text) else end - STREAM_OVERLAP
+        for match in pattern.finditer(buffer, resume - base):
+            if base + match.start() >= safe_end:
+                break
+            yield base + match.start()
+            resume = base + match.end()
+        resume = max(resume, safe_end)
+        keep_from = max(base, safe_end - STREAM_OVERLAP)
+        buffer = buffer[keep_from - base:]
+        base = keep_from
+
+
+def split_pages(text):
+    """(start, end) offsets of each page or document segment of text"""
+    starts = [0] + [start for start in iter_match_starts(text, PAGE_BOUNDARY) if start > 0]
+    ends = starts[1:] + [len(text)]
+    return list(zip(starts, ends))
+
+
+def page_hash(text):
+    """Short content hash for a page of text"""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest()
+
+
+def make_record(text, match_start, match_end):
+    """Legacy requirement entry - the keyword and CONTEXT_WINDOW characters either side"""
+    return {
+        "keyword": text[match_start:match_end],
+        "context": requirement_context(text, {"start": match_start, "end": match_end})
+    }
+
+
+def is_span(entry):
+    """True for a {start, end, page} requirement span, False for a legacy record"""
+    return isinstance(entry, dict) and "start" in entry and "keyword" not in entry
+
+
+def requirement_keyword(text, span):
+    """Matched keyword of a requirement span"""
+    return text[span["start"]:span["end"]]
+
+
+def requirement_context(text, span):
+    """CONTEXT_WINDOW characters either side of a requirement span, built on demand"""
+    start = max(0, span["start"] - CONTEXT_WINDOW)
+    end = min(len(text), span["end"] + CONTEXT_WINDOW)
+    return text[start:end].strip()
+
+
+def iter_requirements(guidelines, category):
+    """Yield a category's entries as legacy {keyword, context} records
+    
+    Span entries are materialized one at a time from full_text; entries
+    already in the legacy shape are passed through.
+    """
+    text = guidelines.get("full_text", "")
+    for entry in guidelines.get(category, []):
+        if is_span(entry):
+            yield make_record(text, entry["start"], entry["end"])
+        else:
+            yield entry
+
+
+def export_legacy(guidelines):
+    """Copy of a guideline dict with every requirement list in the legacy record shape"""
+    legacy = {}
+    for key, value in guidelines.items():
+        if key == "requirement_format":
+            continue
+        if isinstance(value, list) and any(is_span(entry) for entry in value):
+            value = list(iter_requirements(guidelines, key))
+        legacy[key] = value
+    return legacy
+
+
+def coalesce_passages(text, requirements):
+    """Merge overlapping or adjacent context windows into shared passages
+    
+    Every requirement span's CONTEXT_WINDOW window is merged with any
+    window it overlaps or touches, across all categories, as long as the
+    passage stays within MAX_PASSAGE_CHARS. A window that would take it
+    past that starts the next passage, so passages split at window
+    boundaries and every keyword keeps its whole window. Each passage is
+    stored once as {start, end, page, categories, keywords}, tagged with
+    every category that matched inside it. keywords holds each distinct
+    match span with the categories that matched it.
+    """
+    windows = []
+    for category, spans in requirements.items():
+        for span in spans:
+            start = max(0, span["start"] - CONTEXT_WINDOW)
+            end = min(len(text), span["end"] + CONTEXT_WINDOW)
+            windows.append((start, end, category, span))
+    windows.sort(key=lambda w: (w[0], w[1]))
+    
+    order = {category: i for i, category in enumerate(requirements)}
+    passages = []
+    keywords = None  # (start, end) -> categories for the open passage
+    for start, end, category, span in windows:
+        if (passages and start <= passages[-1]["end"]
+                and max(passages[-1]["end"], end) - passages[-1]["start"] <= MAX_PASSAGE_CHARS):
+            passage = passages[-1]
+            passage["end"] = max(passage["end"], end)
+        else:
+            passage = {"start": start, "end": end, "page": span["page"], "categories": [], "keywords": []}
+            passages.append(passage)
+            keywords = {}
+        if category not in passage["categories"]:
+            passage["categories"].append(category)
+        keyword = keywords.get((span["start"], span["end"]))
+        if keyword is None:
+            keyword = keywords[(span["start"], span["end"])] = {
+                "start": span["start"], "end": span["end"], "categories": []
+            }
+            passage["keywords"].append(keyword)
+        if category not in keyword["categories"]:
+            keyword["categories"].append(category)
+    
+    for passage in passages:
+        passage["categories"].sort(key=order.get)
+        passage["keywords"].sort(key=lambda k: (k["start"], k["end"]))
+        for keyword in passage["keywords"]:
+            keyword["categories"].sort(key=order.get)
+    return passages
+
+
+def passage_text(text, passage):
+    """Text of a passage, built on demand"""
+    return text[passage["start"]:passage["end"]].strip()
+
+
+def iter_passages(guidelines, category=None):
+    """Yield passages as {keyword, keywords, context, categories, page} records
+    
+    keyword is the first match, for readers of the legacy record shape.
+    With category set, only passages tagged with it are yielded.
+    """
+    text = guidelines.get("full_text", "")
+    for passage in guidelines.get("passages", []):
+        if category is not None and category not in passage["categories"]:
+            continue
+        keywords = []
+        for keyword in passage["keywords"]:
+            word = requirement_keyword(text, keyword)
+            if word not in keywords:
+                keywords.append(word)
+        yield {
+            "keyword": keywords[0],
+            "keywords": keywords,
+            "context": passage_text(text, passage),
+            "categories": passage["categories"],
+            "page": passage["page"]
+        }
+
+
+def export_passages(guidelines):
+    """Copy of a guideline dict whose requirement lists hold one record per passage
+    
+    Files without passages (legacy or older span files) are exported by
+    export_legacy instead.
+    """
+    if "passages" not in guidelines:
+        return export_legacy(guidelines)
+    exported = {}
+    for key, value in guidelines.items():
+        if key in ("requirement_format", "passages"):
+            continue
+        if isinstance(value, list) and any(is_span(entry) for entry in value):
+            value = list(iter_passages(guidelines, key))
+        exported[key] = value
+    return exported
+
+
+def _literal_prefixes(items):
+    """Lower-case literal prefixes, one of which starts every match of a parsed pattern
+    
+    Returns None when some branch does not begin with a literal, in which
+    case the pattern cannot be prefiltered.
+    """
+    items = list(items)
+    if not items:
+        return None
+    
+    op, av = items[0]
+    if op is sre_constants.LITERAL:
+        prefix = []
+        for op, av in items:
+            if op is not sre_constants.LITERAL:
+                break
+            prefix.append(chr(av))
+        prefix = "".join(prefix).lower()
+        return {prefix} if prefix.isascii() else None
+    if op is sre_constants.SUBPATTERN:
+        return _literal_prefixes(av[-1])
+    if op is sre_constants.BRANCH:
+        prefixes = set()
+        for branch in av[1]:
+            branch_prefixes = _literal_prefixes(branch)
+            if branch_prefixes is None:
+                return None
+            prefixes |= branch_prefixes
+        return prefixes
+    return None
+
+
+def fold_case(text):
+    """Lower-case text for prefix scanning, or None if that would move any offsets"""
+    folded = text.translate(CASE_FOLDS).lower()
+    return folded if len(folded) == len(text) else None
+
+
+class PatternMatcher:
+    """Every category pattern compiled into one prefiltered scanner
+    
+    Each pattern is reduced to the literal words its matches must start
+    with (income, credit, debt, ...). One pass of a single literal
+    alternation over the case-folded text finds every position where any
+    pattern could start. Only the patterns owning that literal are then
+    tried at that position. The result is identical to one re.finditer per
+    pattern. Patterns without a literal prefix fall back to their own
+    finditer pass.
+    """
+    
+    def __init__(self, category_patterns):
+        self.entries = []  # (category, pattern_index, compiled pattern)
+        self.fallback = []  # indexes of patterns that need their own pass
+        literals = {}  # literal -> indexes of patterns starting with it
+        
+        for category, patterns in category_patterns.items():
+            for pattern_index, pattern in enumerate(patterns):
+                index = len(self.entries)
+                self.entries.append((category, pattern_index, re.compile(pattern)))
+                prefixes = _literal_prefixes(sre_parse.parse(pattern))
+                if not prefixes:
+                    self.fallback.append(index)
+                    continue
+                for prefix in prefixes:
+                    literals.setdefault(prefix, []).append(index)
+        
+        # Literals grouped by first character for the per-candidate dispatch
+        self.dispatch = {}
+        for literal, indexes in literals.items():
+            self.dispatch.setdefault(literal[0], []).append((literal, indexes))
+        
+        alternation = "|".join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True))
+        self.scanner = re.compile(alternation) if literals else None
+        # Used when case folding would shift offsets in unusual text
+        self.scanner_ignorecase = re.compile(alternation, re.IGNORECASE) if literals else None
+        
+        self.prefiltered = sorted(set(range(len(self.entries))) - set(self.fallback))
+        self.passes = (1 if literals else 0) + len(self.fallback)
+    
+    def _candidates(self, text, folded, pos, endpos, accept_end):
+        """Positions where some pattern's literal prefix occurs, in order
+        
+        folded is the case-folded text[pos:endpos], or None to scan text
+        itself case-insensitively.
+        """
+        if folded is not None:
+            scanner, haystack, offset = self.scanner, folded, pos
+            candidate = scanner.search(haystack)
+        else:
+            scanner, haystack, offset = self.scanner_ignorecase, text, 0
+            candidate = scanner.search(haystack, pos, endpos)
+        while candidate and candidate.start() + offset < accept_end:
+            yield candidate.start() + offset
+            # Literals can overlap, so resume one character later
+            candidate = scanner.search(haystack, candidate.start() + 1, endpos - offset)
+    
+    def scan(self, text, pos=0, endpos=None, accept_end=None, next_start=None):
+        """(start, end) spans of every pattern's matches, aligned with self.entries
+        
+        next_start, if given, holds where each pattern may match next and is
+        updated in place, so a scan can resume where a previous one stopped.
+        """
+        endpos = len(text) if endpos is None else endpos
+        accept_end = endpos if accept_end is None else accept_end
+        spans = [[] for _ in self.entries]
+        # Where each pattern may match next - finditer matches never overlap
+        if next_start is None:
+            next_start = [pos] * len(self.entries)
+        
+        if self.scanner is not None:
+            folded = fold_case(text[pos:endpos])
+            for at in self._candidates(text, folded, pos, endpos, accept_end):
+                if folded is not None:
+                    indexes = [index for literal, owners in self.dispatch.get(folded[at - pos], ())
+                               if folded.startswith(literal, at - pos) for index in owners]
+                else:
+                    indexes = self.prefiltered
+                for index in indexes:
+                    if at < next_start[index]:
+                        continue
+                    match = self.entries[index][2].match(text, at, endpos)
+                    if match:
+                        spans[index].append(match.span())
+                        next_start[index] = max(match.end(), at + 1)
+        
+        for index in self.fallback:
+            for match in self.entries[index][2].finditer(text, max(pos, next_start[index]), endpos):
+                if match.start() >= accept_end:
+                    break
+                spans[index].append(match.span())
+                next_start[index] = max(match.end(), match.start() + 1)
+        
+        return spans
+    
+    def scan_per_pattern(self, text, pos=0, endpos=None, accept_end=None):
+        """Reference implementation - one re.finditer per pattern"""
+        endpos = len(text) if endpos is None else endpos
+        accept_end = endpos if accept_end is None else accept_end
+        spans = []
+        for category, pattern_index, pattern in self.entries:
+            spans.append([])
+            for match in pattern.finditer(text, pos, endpos):
+                if match.start() >= accept_end:
+                    break
+                spans[-1].append(match.span())
+        return spans
+
+
+_matchers = {}
+
+
+def matcher_for(category_patterns):
+    """Compiled PatternMatcher for a set of category patterns, built once per process"""
+    key = tuple((category, tuple(patterns)) for category, patterns in category_patterns.items())
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = PatternMatcher(category_patterns)
+    return matcher
+
+
+def find_requirements(text, category_patterns, pos=0, endpos=None, accept_end=None):
+    """Run every category's patterns over text in a single pass
+    
+    Returns {category: [(pattern_index, match_start, match_end)]} ordered by
+    pattern and then position, the same order as one re.finditer per
+    pattern. Only matches starting before accept_end are kept.
+    """
+    matcher = matcher_for(category_patterns)
+    found = {category: [] for category in category_patterns}
+    
+    for (category, pattern_index, _), spans in zip(matcher.entries, matcher.scan(text, pos, endpos, accept_end)):
+        for start, end in spans:
+            found[category].append((pattern_index, start, end))
+    
+    return found
+
+
+class StreamParser:
+    """Page splitting, page hashing and pattern matching over text fed in pieces
+    
+    Only the text not yet processed, plus STREAM_OVERLAP characters either
+    side of it, is kept, so memory stays flat however long the text is.
+    Page boundaries and matches are only accepted once STREAM_OVERLAP
+    characters past them have arrived, so a match or page marker split
+    across two pieces is still found whole. The results are identical to
+    split_pages, page_hash and find_requirements over the joined text.
+    """
+    
+    def __init__(self, category_patterns=None):
+        self.category_patterns = category_patterns
+        self.matcher = matcher_for(category_patterns) if category_patterns else None
+        self.buffer = ""
+        self.base = 0  # offset of buffer[0] in the whole text
+        self.done = 0  # everything before this offset has been processed
+        self.page_starts = [0]
+        self.boundary_end = 0
+        self.hashed_to = 0
+        self.hashes = []
+        self.hasher = hashlib.blake2b(digest_size=8)
+        if self.matcher:
+            self.next_start = [0] * len(self.matcher.entries)
+            self.spans = [[] for _ in self.matcher.entries]
+    
+    def feed(self, piece):
+        self.buffer += piece
+        self._process(final=False)
+    
+    def _hash_to(self, end):
+        """Add text up to end to the current page's hash"""
+        if end > self.hashed_to:
+            self.hasher.update(self.buffer[self.hashed_to - self.base:end - self.base].encode('utf-8', 'surrogatepass'))
+        self.hashed_to = end
+    
+    def _process(self, final):
+        end = self.base + len(self.buffer)
+        safe_end = end if final else end - STREAM_OVERLAP
+        if safe_end <= self.done:
+            return
+        
+        # Page boundaries starting before safe_end
+        scan_from = max(self.done, self.boundary_end) - self.base
+        for boundary in PAGE_BOUNDARY.finditer(self.buffer, scan_from):
+            start = self.base + boundary.start()
+            if start >= safe_end:
+                break
+            self.boundary_end = self.base + boundary.end()
+            if start > 0:
+                self._hash_to(start)
+                self.hashes.append(self.hasher.hexdigest())
+                self.hasher = hashlib.blake2b(digest_size=8)
+                self.page_starts.append(start)
+        self._hash_to(safe_end)
+        
+        # Matches starting before safe_end; lookbehinds still see the overlap
+        if self.matcher:
+            local_next = [max(0, n - self.base) for n in self.next_start]
+            found = self.matcher.scan(self.buffer, self.done - self.base, len(self.buffer),
+                                      safe_end - self.base, next_start=local_next)
+            for spans, more in zip(self.spans, found):
+                spans.extend((start + self.base, stop + self.base) for start, stop in more)
+            self.next_start = [n + self.base for n in local_next]
+        
+        self.done = safe_end
+        keep_from = max(self.base, safe_end - STREAM_OVERLAP)
+        self.buffer = self.buffer[keep_from - self.base:]
+        self.base = keep_from
+    
+    def close(self):
+        """Process the remaining text; returns (pages, hashes)"""
+        self._process(final=True)
+        self.hashes.append(self.hasher.hexdigest())
+        ends = self.page_starts[1:] + [self.done]
+        return list(zip(self.page_starts, ends)), self.hashes
+    
+    def requirements(self):
+        """{category: [(pattern_index, match_start, match_end)]}, as find_requirements"""
+        found = {category: [] for category in self.category_patterns}
+        for (category, pattern_index, _), spans in zip(self.matcher.entries, self.spans):
+            found[category].extend((pattern_index, start, end) for start, end in spans)
+        return found
+
+
+def _find_window(text, category_patterns, start, end):
+    """find_requirements for matches starting in start:end of a str or ShardedText"""
+    window_start = max(0, start - STREAM_OVERLAP)
+    window = text[window_start:min(len(text), end + MAX_MATCH_LENGTH)]
+    found = find_requirements(window, category_patterns, pos=start - window_start,
+                              accept_end=end - window_start)
+    return {
+        category: [(pattern_index, s + window_start, e + window_start) for pattern_index, s, e in entries]
+        for category, entries in found.items()
+    }
+
+
+def _load_json(path):
+    """Load a JSON file, or None if it is missing or unreadable"""
+    try:
+        return guideline_json.load(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_previous(json_file):
+    """Previous run's guidelines with full_text, or None if missing or unreadable"""
+    try:
+        return load_guidelines(json_file)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _dirty_pages(pages, seeds):
+    """Expand changed pages by neighbours until CONTEXT_WINDOW characters are covered
+    
+    A match on an unchanged page still picks up context from a changed
+    neighbour, so those pages have to be reparsed as well.
+    """
+    margin = CONTEXT_WINDOW + MAX_MATCH_LENGTH
+    dirty = set()
+    for seed in seeds:
+        dirty.add(seed)
+        covered, page = 0, seed - 1
+        while page >= 0 and covered < margin:
+            dirty.add(page)
+            covered += pages[page][1] - pages[page][0]
+            page -= 1
+        covered, page = 0, seed + 1
+        while page < len(pages) and covered < margin:
+            dirty.add(page)
+            covered += pages[page][1] - pages[page][0]
+            page += 1
+    return dirty
+
+
+def _page_runs(page_numbers):
+    """Group sorted page numbers into contiguous (first, last) runs"""
+    runs = []
+    for page in sorted(page_numbers):
+        if runs and runs[-1][1] == page - 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return runs
+
+
+def _record_digest(record):
+    return hashlib.blake2b(json.dumps(record, sort_keys=True).encode('utf-8', 'surrogatepass'),
+                           digest_size=16).digest()
+
+
+def _change_entries(guidelines, category, with_context=False):
+    """(record digest, change log entry) for each entry of a category, in document order
+    
+    The log entry is the span and page with the matched keyword and a
+    digest of the context, plus the context itself when with_context is
+    set (for entries whose text will not be kept).
+    """
+    text = guidelines.get("full_text", "")
+    for entry in guidelines.get(category, []):
+        record = make_record(text, entry["start"], entry["end"]) if is_span(entry) else entry
+        logged = {key: entry[key] for key in ("start", "end", "page") if key in entry}
+        logged["keyword"] = record["keyword"]
+        logged["context_digest"] = page_hash(record["context"])
+        if with_context:
+            logged["context"] = record["context"]
+        yield _record_digest(record), logged
+
+
+def _entries_not_in(guidelines, category, others, with_context=False):
+    """Change log entries of a category whose digest count exceeds that in others, in document order"""
+    surplus = Counter(digest for digest, _ in _change_entries(guidelines, category))
+    surplus.subtract(others)
+    extra = []
+    for digest, logged in _change_entries(guidelines, category, with_context):
+        if surplus[digest] > 0:
+            surplus[digest] -= 1
+            extra.append(logged)
+    return extra
+
+
+def _change_log(category_patterns, old_guidelines, new_guidelines):
+    """Added and removed requirement entries per category
+    
+    Spans move whenever earlier text changes, so entries are compared by
+    keyword and context rather than by offset. Records are compared by
+    digest and only the differing ones are kept in memory. Each is logged
+    as {start, end, page, keyword, context_digest}. Added spans point into
+    the new text; removed ones point into the previous run's text, whose
+    shards are pruned once it is replaced, so they also carry their context.
+    """
+    categories = {}
+    for category in category_patterns:
+        old = Counter(digest for digest, _ in _change_entries(old_guidelines, category))
+        new = Counter(digest for digest, _ in _change_entries(new_guidelines, category))
+        added = _entries_not_in(new_guidelines, category, old) if new - old else []
+        removed = _entries_not_in(old_guidelines, category, new, with_context=True) if old - new else []
+        if added or removed:
+            categories[category] = {"added": added, "removed": removed}
+    return categories
+
+
+def _generation(text):
+    """Shard generation a ShardedText was written as - None for a str"""
+    return text.table.get("generation") if isinstance(text, ShardedText) else None
+
+
+def update_requirements(text, category_patterns, json_file, index_file, incremental=False):
+    """Extract requirement entries for every category and record what changed
+    
+    In incremental mode the page hashes of text are diffed against the
+    previous run's index. Only changed pages, plus enough neighbours to
+    cover the context window, are reparsed. Entries on other pages are
+    carried over from the previous json_file. Otherwise every pattern is
+    run over the full text. The previous index is only used if it was
+    stamped with the shard generation of the previous json_file's text.
+    
+    Entries are {start, end, page} spans into text, page being the index
+    of the page or document segment the match starts in. Returns
+    (requirements, page_index, changes): {category: [spans]} plus
+    "passages", the coalesced context windows of every category; the page
+    index for the next run; and a change log of added and removed entries
+    per category. Nothing is written - the page index and change log are
+    saved with the guidelines they describe.
+    
+    text may be a str or a ShardedText. It is read in STREAM_CHUNK pieces
+    (and reparse windows by slice), so a ShardedText is never decoded whole.
+    """
+    previous = _load_previous(json_file) if json_file.exists() else None
+    previous_index = _load_json(index_file) if index_file.exists() else None
+    old_entries = {
+        category: previous.get(category, []) for category in category_patterns
+    } if previous else {}
+    
+    usable_index = (
+        incremental and previous and previous_index
+        and previous.get("requirement_format") == REQUIREMENT_FORMAT
+        and previous_index.get("version") == INDEX_VERSION
+        and previous_index.get("generation") == _generation(previous["full_text"])
+        and all(
+            len(previous_index["entries"].get(category, [])) == len(old_entries.get(category, []))
+            for category in category_patterns
+        )
+    )
+    
+    # Pages and hashes always; every match too unless the index lets us reparse less
+    stream = StreamParser(None if usable_index else category_patterns)
+    for piece in iter_chunks(text):
+        stream.feed(piece)
+    pages, hashes = stream.close()
+    page_starts = [start for start, end in pages]
+    
+    kept = {category: [] for category in category_patterns}
+    if usable_index:
+        # Align old and new pages by content hash
+        matcher = difflib.SequenceMatcher(None, previous_index["pages"], hashes, autojunk=False)
+        page_map = {}
+        seeds = set()
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                page_map.update(zip(range(i1, i2), range(j1, j2)))
+            elif j2 > j1:
+                seeds.update(range(j1, j2))
+            else:
+                # Deleted pages - the text either side of the gap now touches
+                seeds.update(page for page in (j1 - 1, j1) if 0 <= page < len(pages))
+        dirty = _dirty_pages(pages, seeds)
+        
+        # Carry over entries whose page is unchanged and outside the reparse margin
+        for category in category_patterns:
+            locations = previous_index["entries"].get(category, [])
+            for (pattern_index, old_page, offset), span in zip(locations, old_entries[category]):
+                new_page = page_map.get(old_page)
+                if new_page is not None and new_page not in dirty:
+                    start = pages[new_page][0] + offset
+                    kept[category].append((pattern_index, start, start + span["end"] - span["start"]))
+        
+        mode = "incremental"
+        found = {category: [] for category in category_patterns}
+        for first, last in _page_runs(dirty):
+            run = _find_window(text, category_patterns, pages[first][0], pages[last][1])
+            for category, entries in run.items():
+                found[category].extend(entries)
+        reparsed = len(dirty)
+    else:
+        mode = "full"
+        found = stream.requirements()
+        reparsed = len(pages)
+    
+    # Merge in pattern order then document order, as a full parse would
+    requirements = {}
+    locations = {}
+    for category in category_patterns:
+        merged = sorted(kept[category] + found[category])
+        requirements[category] = []
+        locations[category] = []
+        for pattern_index, match_start, match_end in merged:
+            page = bisect.bisect_right(page_starts, match_start) - 1
+            requirements[category].append({"start": match_start, "end": match_end, "page": page})
+            locations[category].append([pattern_index, page, match_start - pages[page][0]])
+    
+    page_index = {"version": INDEX_VERSION, "generation": _generation(text), "pages": hashes,
+                  "entries": locations}
+    
+    changes = {
+        "generated_at": datetime.now().isoformat(),
+        "mode": mode,
+        "pages": {"total": len(pages), "reparsed": reparsed},
+        "categories": _change_log(category_patterns, previous or {},
+                                  dict(requirements, full_text=text))
+    }
+    
+    passages = coalesce_passages(text, requirements)
+    print(f"Parsed requirements ({mode}): reparsed {reparsed}/{len(pages)} pages, "
+          f"{sum(len(spans) for spans in requirements.values())} matches in {len(passages)} passages")
+    return dict(requirements, passages=passages), page_index, changes
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Guideline Store
+On-disk layout for guideline data - a small JSON index per agency with the
+full text split out into UTF-8 shard files addressed by byte offset. Offsets
+always count uncompressed bytes, so shards may be compressed or not
+"""
+
+import os
+import re
+import time
+import mmap
+import bisect
+from pathlib import Path
+import guideline_json
+import guideline_compress
+
+# Target size of one text shard
+SHARD_BYTES = 1 << 20
+
+# Characters between recorded (character, byte) offset pairs
+CHECKPOINT_CHARS = 1 << 14
+
+# Characters read at a time when streaming text through
+CHUNK_CHARS = 1 << 16
+
+
+# Value of "offsets" in an index whose spans count UTF-8 bytes of the shards
+OFFSET_UNITS = "utf-8"
+
+
+def _span_dicts(guidelines):
+    """Every {start, end} dict of a guideline dict - requirement spans, passages and their keywords"""
+    for key, value in guidelines.items():
+        if not isinstance(value, list):
+            continue
+        for entry in value:
+            if isinstance(entry, dict) and "start" in entry and "end" in entry:
+                yield entry
+                for keyword in entry.get("keywords", []):
+                    if isinstance(keyword, dict):
+                        yield keyword
+
+
+def _convert_offsets(guidelines, measure):
+    """Copy of guidelines with every span offset mapped through measure
+    
+    measure(offsets) takes the sorted distinct offsets and returns them
+    converted, in the same order.
+    """
+    converted = guideline_json.loads(guideline_json.dumps(guidelines, pretty=False))
+    spans = list(_span_dicts(converted))
+    offsets = sorted({span[field] for span in spans for field in ("start", "end")})
+    mapping = dict(zip(offsets, measure(offsets)))
+    for span in spans:
+        span["start"] = mapping[span["start"]]
+        span["end"] = mapping[span["end"]]
+    return converted
+
+
+def byte_to_char_offsets(data, offsets):
+    """Character offsets of sorted UTF-8 byte offsets into data"""
+    converted = []
+    previous = position = 0
+    for offset in offsets:
+        position += len(data[previous:offset].decode('utf-8', 'surrogatepass'))
+        converted.append(position)
+        previous = offset
+    return converted
+
+
+def new_generation():
+    """Token naming one write of an agency's shards - hex nanoseconds, so later writes sort later"""
+    return f"{time.time_ns():x}"
+
+
+def shard_name(json_file, generation, number):
+    """File name of a text shard next to json_file: <stem>.<generation>.NNN.txt"""
+    return f"{Path(json_file).stem}.{generation}.{number:03d}.txt"
+
+
+def _is_shard(json_file, name):
+    """Whether name is a text shard of json_file, of any generation or the unversioned layout"""
+    stem = re.escape(Path(json_file).stem)
+    return re.fullmatch(rf"{stem}\.(?:[0-9a-f]+\.)?[0-9]{{3}}\.txt(?:\.new)?", name) is not None
+
+
+class TextWriter:
+    """Stream text into new UTF-8 shards for json_file, one piece at a time
+    
+    Every write gets a new generation in its shard names, so the shards
+    the current index and the combined file point at are never touched
+    and stay readable until prune_shards removes them. Every
+    CHECKPOINT_CHARS characters the character and byte offsets are
+    recorded, which lets ShardedText map between them without decoding
+    from the start. Shards are compressed if compression is on; the shard
+    table still records uncompressed bytes.
+    """
+    
+    def __init__(self, json_file):
+        self.json_file = Path(json_file)
+        self.generation = new_generation()
+        self.shards = []
+        self.checkpoints = [[0, 0]]
+        self.chars = 0
+        self.bytes = 0
+        self.file = None
+    
+    def _roll(self):
+        """Close the current shard and start the next one"""
+        if self.file:
+            self.file.close()
+            self.shards[-1]["end"] = self.bytes
+        name = shard_name(self.json_file, self.generation, len(self.shards))
+        self.file = guideline_compress.open_write(self.json_file.parent / name)
+        self.shards.append({"file": name, "start": self.bytes, "end": self.bytes})
+    
+    def write(self, text):
+        for offset in range(0, len(text), CHECKPOINT_CHARS):
+            piece = text[offset:offset + CHECKPOINT_CHARS]
+            data = piece.encode('utf-8', 'surrogatepass')
+            if self.file is None or self.bytes - self.shards[-1]["start"] >= SHARD_BYTES:
+                self._roll()
+            self.file.write(data)
+            self.chars += len(piece)
+            self.bytes += len(data)
+            if self.chars - self.checkpoints[-1][0] >= CHECKPOINT_CHARS:
+                self.checkpoints.append([self.chars, self.bytes])
+    
+    def write_file(self, path):
+        """Append the contents of a UTF-8 text file without reading it whole
+        
+        A compressed file is decompressed as it streams through.
+        """
+        with guideline_compress.open_text(path, newline='') as f:
+            for chunk in iter(lambda: f.read(CHUNK_CHARS), ""):
+                self.write(chunk)
+    
+    def close(self):
+        """Finish the last shard and return the text as a ShardedText"""
+        if self.file:
+            self.file.close()
+            self.shards[-1]["end"] = self.bytes
+            self.file = None
+        table = {
+            "encoding": "utf-8",
+            "generation": self.generation,
+            "bytes": self.bytes,
+            "chars": self.chars,
+            "shards": self.shards,
+            "checkpoints": self.checkpoints
+        }
+        return ShardedText(self.json_file, table)
+
+
+class ShardedText:
+    """Read-only, character-addressed view of text stored in shards
+    
+    Supports len() and slicing like a str, decoding only the bytes between
+    the checkpoints around the slice, so contexts and reparse windows are
+    read without loading the whole text.
+    """
+    
+    def __init__(self, json_file, table):
+        self.json_file = Path(json_file)
+        self.table = table
+        self.reader = TextShards(json_file, {"text": table})
+        self.char_marks = [chars for chars, _ in table["checkpoints"]]
+        self.byte_marks = [data for _, data in table["checkpoints"]]
+        self.recent = (0, -1, "")
+    
+    def __len__(self):
+        return self.table["chars"]
+    
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            key = slice(key, key + 1)
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError("ShardedText slices must be contiguous")
+        if start >= stop:
+            return ""
+        first = bisect.bisect_right(self.char_marks, start) - 1
+        last = bisect.bisect_left(self.char_marks, stop)
+        # Nearby slices (contexts in document order) reuse the last decoded blocks
+        cached_first, cached_last, text = self.recent
+        if not cached_first <= first or not last <= cached_last:
+            end = self.byte_marks[last] if last < len(self.byte_marks) else self.table["bytes"]
+            text = self.reader.read(self.byte_marks[first], end)
+            self.recent = (first, last, text)
+        else:
+            first = cached_first
+        return text[start - self.char_marks[first]:stop - self.char_marks[first]]
+    
+    def _block(self, mark):
+        """Byte range of the text between checkpoint mark and the next one"""
+        end = self.byte_marks[mark + 1] if mark + 1 < len(self.byte_marks) else self.table["bytes"]
+        return self.byte_marks[mark], end
+    
+    def byte_offsets(self, offsets):
+        """UTF-8 byte offsets of sorted character offsets"""
+        converted = []
+        block_mark = block = None
+        for offset in offsets:
+            mark = bisect.bisect_right(self.char_marks, offset) - 1
+            if mark != block_mark:
+                block_mark, block = mark, self.reader.read(*self._block(mark))
+            prefix = block[:offset - self.char_marks[mark]]
+            converted.append(self.byte_marks[mark] + len(prefix.encode('utf-8', 'surrogatepass')))
+        return converted
+    
+    def char_offsets(self, offsets):
+        """Character offsets of sorted UTF-8 byte offsets"""
+        converted = []
+        block_mark = block = None
+        for offset in offsets:
+            mark = bisect.bisect_right(self.byte_marks, offset) - 1
+            if mark != block_mark:
+                block_mark, block = mark, self.reader.read_bytes(*self._block(mark))
+            prefix = block[:offset - self.byte_marks[mark]]
+            converted.append(self.char_marks[mark] + len(prefix.decode('utf-8', 'surrogatepass')))
+        return converted
+    
+    def sync(self):
+        """Flush the shards to disk, before an index points at them"""
+        for shard in self.table["shards"]:
+            fd = os.open(self.json_file.parent / shard["file"], os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    
+    def close(self):
+        self.reader.close()
+
+
+def save_guidelines(guidelines, json_file):
+    """Write guidelines as a JSON index plus UTF-8 text shards
+    
+    full_text is either a str, written out to a new generation of
+    <stem>.<generation>.NNN.txt shards next to json_file, or a ShardedText
+    already streamed there by a TextWriter. Every span offset in the
+    index is converted from characters to bytes of the concatenated
+    shards. The index replaces json_file atomically once the shards are
+    on disk; the previous generation is left for prune_shards.
+    """
+    json_file = Path(json_file)
+    text = guidelines.get("full_text", "")
+    if not isinstance(text, ShardedText):
+        writer = TextWriter(json_file)
+        writer.write(text)
+        text = writer.close()
+    
+    index = _convert_offsets(
+        {key: value for key, value in guidelines.items() if key != "full_text"},
+        text.byte_offsets
+    )
+    index["offsets"] = OFFSET_UNITS
+    index["text"] = text.table
+    
+    text.sync()
+    guideline_json.save(index, json_file)
+    save_manifest(summarize_guidelines(index), json_file)
+
+
+def index_shards(json_file):
+    """Shard files json_file's index reads its text from - none if there is no sharded index"""
+    try:
+        index = load_index(json_file)
+    except (OSError, ValueError):
+        return set()
+    return {shard["file"] for shard in index.get("text", {}).get("shards", [])}
+
+
+def combined_shards(combined_file, key):
+    """Shard files the combined file's entry for key reads passage text from"""
+    try:
+        entry = guideline_json.load(combined_file)["guidelines"][key]
+    except (OSError, ValueError, KeyError, TypeError):
+        return set()
+    return {shard["file"] for shard in entry.get("text", {}).get("shards", [])}
+
+
+def prune_shards(json_file, keep=()):
+    """Delete shards of json_file that neither its index nor keep names
+    
+    keep is for the shards a combined file still points at - old
+    generations are only removed once nothing reads them. Returns the
+    number of shards deleted.
+    """
+    json_file = Path(json_file)
+    if not json_file.exists():
+        return 0
+    keep = set(keep) | index_shards(json_file)
+    removed = 0
+    for path in json_file.parent.glob(f"{json_file.stem}.*.txt*"):
+        if _is_shard(json_file, path.name) and path.name not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def summarize_guidelines(guidelines):
+    """Source, last update and the length of each list of entries"""
+    return {
+        "source": guidelines.get("source", "N/A"),
+        "last_updated": guidelines.get("last_updated", "N/A"),
+        "counts": {
+            key: len(value) for key, value in guidelines.items()
+            if isinstance(value, list) and key != "passages"
+            and all(isinstance(entry, dict) for entry in value)
+        }
+    }
+
+
+def manifest_path(json_file):
+    """<stem>.manifest.json next to json_file"""
+    json_file = Path(json_file)
+    return json_file.with_name(f"{json_file.stem}.manifest.json")
+
+
+def save_manifest(summary, json_file):
+    """Save summary next to json_file, stamped with the index's size and mtime"""
+    stat = Path(json_file).stat()
+    manifest = {**summary, "index_size": stat.st_size, "index_mtime_ns": stat.st_mtime_ns}
+    guideline_json.save(manifest, manifest_path(json_file))
+
+
+def load_summary(json_file):
+    """summarize_guidelines of json_file without loading it, from its manifest
+    
+    A manifest that is missing, or stamped for a different version of
+    the index, is rebuilt from the index.
+    """
+    stat = Path(json_file).stat()
+    try:
+        manifest = guideline_json.load(manifest_path(json_file))
+        if manifest["index_size"] == stat.st_size and manifest["index_mtime_ns"] == stat.st_mtime_ns:
+            return {key: manifest[key] for key in ("source", "last_updated", "counts")}
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    summary = summarize_guidelines(load_index(json_file))
+    save_manifest(summary, json_file)
+    return summary
+
+
+def load_index(json_file):
+    """The JSON index of json_file as stored - offsets in bytes, no full_text"""
+    return guideline_json.load(json_file)
+
+
+def load_guidelines(json_file):
+    """Load guidelines with full_text and character offsets, as the scrapers build them
+    
+    full_text is a ShardedText read from the shards on demand. Files
+    written before the text was split out are returned unchanged, and
+    shards without checkpoints are decoded into a str.
+    """
+    index = load_index(json_file)
+    if "text" not in index:
+        return index
+    
+    guidelines = {key: value for key, value in index.items() if key not in ("offsets", "text")}
+    if "checkpoints" in index["text"]:
+        text = ShardedText(json_file, index["text"])
+        guidelines = _convert_offsets(guidelines, text.char_offsets)
+        guidelines["full_text"] = text
+        return guidelines
+    
+    with TextShards(json_file, index) as shards:
+        data = shards.read_bytes(0, index["text"]["bytes"])
+    guidelines = _convert_offsets(guidelines, lambda offsets: byte_to_char_offsets(data, offsets))
+    guidelines["full_text"] = data.decode('utf-8', 'surrogatepass')
+    return guidelines
+
+
+class TextShards:
+    """Byte-range reads over an index's text shards, memory-mapped on first use
+    
+    A compressed shard is decompressed whole the first time it is read and
+    kept in memory until the reader is closed.
+    """
+    
+    def __init__(self, json_file, index):
+        self.directory = Path(json_file).parent
+        self.shards = index["text"]["shards"]
+        self.starts = [shard["start"] for shard in self.shards]
+        self.maps = {}
+    
+    def _map(self, number):
+        """Memory map (or decompressed bytes) of one shard"""
+        if number not in self.maps:
+            shard = self.shards[number]
+            if shard["end"] == shard["start"]:
+                self.maps[number] = b""
+            else:
+                with open(self.directory / shard["file"], 'rb') as f:
+                    if guideline_compress.codec_of(f.peek(4)):
+                        self.maps[number] = guideline_compress.decompress(f.read())
+                    else:
+                        self.maps[number] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[number]
+    
+    def read_bytes(self, start, end):
+        """Bytes start:end of the concatenated shards"""
+        pieces = []
+        number = max(0, bisect.bisect_right(self.starts, start) - 1)
+        while number < len(self.shards) and self.shards[number]["start"] < end:
+            shard = self.shards[number]
+            lo = max(start, shard["start"]) - shard["start"]
+            hi = min(end, shard["end"]) - shard["start"]
+            pieces.append(self._map(number)[lo:hi])
+            number += 1
+        return b"".join(pieces)
+    
+    def read(self, start, end):
+        """Text of the byte range start:end"""
+        return self.read_bytes(start, end).decode('utf-8', 'surrogatepass')
+    
+    def close(self):
+        for mapped in self.maps.values():
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self.maps = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_index(json_file):
+    """Server-facing copy of an agency index with one record per passage
+    
+    Each requirement list holds {passage, keyword, keywords, categories,
+    page} records for the passages tagged with it. The passage text stays
+    in the shards and is read by the passage's byte range when needed.
+    """
+    index = load_index(json_file)
+    records = []
+    with TextShards(json_file, index) as shards:
+        for number, passage in enumerate(index.get("passages", [])):
+            keywords = []
+            for keyword in passage["keywords"]:
+                word = shards.read(keyword["start"], keyword["end"])
+                if word not in keywords:
+                    keywords.append(word)
+            records.append({
+                "passage": number,
+                "keyword": keywords[0],
+                "keywords": keywords,
+                "categories": passage["categories"],
+                "page": passage["page"]
+            })
+    
+    exported = {}
+    for key, value in index.items():
+        if key == "requirement_format":
+            continue
+        if key != "passages" and isinstance(value, list) and any(
+                isinstance(entry, dict) and "start" in entry for entry in value):
+            value = [record for record in records if key in record["categories"]]
+        exported[key] = value
+    return exported
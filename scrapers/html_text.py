@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+HTML Text Extraction
+Main text of a web page and its sections split at headings, built in one walk of the
+parsed tree - a BeautifulSoup html.parser tree, or an lxml tree when lxml is asked for
+"""
+
+import importlib.util
+
+# BeautifulSoup and lxml are imported by the functions that parse pages -
+# a run that fetches no web page never loads them
+
+# Headings an HTML document is split into sections at
+HTML_HEADINGS = ['h1', 'h2', 'h3', 'h4']
+
+# "html.parser" builds a BeautifulSoup tree with the standard library parser;
+# "lxml" walks lxml's own tree, an order of magnitude faster on long pages, but
+# repairs malformed markup differently (a <p> inside a heading closes it)
+HTML_PARSERS = ["html.parser", "lxml"]
+
+# Elements whose strings only count as text inside themselves, as in
+# BeautifulSoup - get_text() of anything else leaves out scripts, styles,
+# templates and ruby annotations
+STRING_CONTAINERS = {"rt", "rp", "style", "script", "template"}
+
+_options = {"parser": "html.parser"}
+
+
+def lxml_available():
+    """Whether lxml is installed, without importing it"""
+    return importlib.util.find_spec("lxml") is not None
+
+
+def configure_html(**options):
+    """Set the parser ("html.parser" or "lxml") web pages are parsed with"""
+    if options.get("parser") == "lxml" and not lxml_available():
+        raise ValueError("lxml is not installed")
+    _options.update(options)
+
+
+def html_options():
+    """Current settings, for passing to worker processes"""
+    return dict(_options)
+
+
+class _Collector:
+    """Stripped strings of one element, as its get_text(strip=True) joins them"""
+    
+    def __init__(self, kind, done):
+        self.kind = kind
+        self.pieces = []
+        self.done = done
+
+
+def sectionize(events):
+    """(text, sections) from the events of a walk over the main content element
+    
+    events are ("start", name, kind), ("text", string, kind) and ("end",
+    None, None) in document order, starting with the root element. A
+    string's kind is the innermost string container around it (None for
+    page text) and an element's kind is the kind of string its own text
+    is made of.
+    
+    text is the root's stripped strings, one per line. Each h1-h4 gets a
+    section whose content is the text of the elements after it with the
+    same parent, up to the next heading among them, one line per element.
+    Every string is visited once - added to the text and to each open
+    heading or section element it sits in - so long pages with hundreds
+    of headings stay linear.
+    """
+    text = []
+    text_kind = None
+    sections = []
+    
+    # Per open element: [section its next element children belong to, collectors it opened]
+    elements = []
+    collectors = []
+    for event, value, kind in events:
+        if event == "text":
+            stripped = value.strip()
+            if not stripped:
+                continue
+            if kind == text_kind:
+                text.append(stripped)
+            for collector in collectors:
+                if collector.kind == kind:
+                    collector.pieces.append(stripped)
+        elif event == "start":
+            opened = 0
+            if not elements:
+                text_kind = kind
+            elif value in HTML_HEADINGS:
+                section = {'heading': '', 'level': value, 'content': []}
+                sections.append(section)
+                elements[-1][0] = section
+                collectors.append(_Collector(kind, lambda heading, section=section: section.update(heading=heading)))
+                opened = 1
+            elif elements[-1][0] is not None:
+                collectors.append(_Collector(kind, elements[-1][0]['content'].append))
+                opened = 1
+            elements.append([None, opened])
+        else:
+            _, opened = elements.pop()
+            for _ in range(opened):
+                collector = collectors.pop()
+                collector.done("".join(collector.pieces))
+    
+    for section in sections:
+        section['content'] = '\n'.join(section['content'])
+    return '\n'.join(text), sections
+
+
+def soup_events(root, string_containers):
+    """sectionize events of a BeautifulSoup element
+    
+    string_containers is the tree builder's {element name: string class}.
+    """
+    from bs4.element import Tag, NavigableString, CData
+    page_strings = getattr(Tag, "MAIN_CONTENT_STRING_TYPES", {NavigableString, CData})
+    kinds = {string_class: name for name, string_class in string_containers.items()}
+    
+    yield "start", root.name, root.name if root.name in string_containers else None
+    stack = [iter(root.children)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            yield "end", None, None
+        elif isinstance(node, Tag):
+            yield "start", node.name, node.name if node.name in string_containers else None
+            stack.append(iter(node.children))
+        elif type(node) in page_strings:
+            yield "text", node, None
+        elif type(node) in kinds:
+            # Comments, doctypes and the like are never text
+            yield "text", node, kinds[type(node)]
+
+
+def lxml_events(root):
+    """sectionize events of an lxml element - comments and processing instructions are skipped"""
+    kind = root.tag if root.tag in STRING_CONTAINERS else None
+    yield "start", root.tag, kind
+    if root.text:
+        yield "text", root.text, kind
+    
+    # (element, its children, kind of the strings directly inside it)
+    stack = [(root, iter(root), kind)]
+    while stack:
+        element, children, kind = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield "end", None, None
+            # The root's tail is outside it
+            if stack and element.tail:
+                yield "text", element.tail, stack[-1][2]
+            continue
+        
+        if not isinstance(child.tag, str):
+            if child.tail:
+                yield "text", child.tail, kind
+            continue
+        container = child.tag if child.tag in STRING_CONTAINERS else None
+        yield "start", child.tag, container
+        if child.text:
+            yield "text", child.text, container or kind
+        stack.append((child, iter(child), container or kind))
+
+
+def _lxml_string(element):
+    """BeautifulSoup's .string of an lxml element - its text if that is all it holds"""
+    if len(element) == 0:
+        return element.text
+    if len(element) == 1 and not element.text and not element[0].tail:
+        return _lxml_string(element[0])
+    return None
+
+
+def _extract_lxml(content):
+    from lxml import etree, html
+    from bs4.dammit import UnicodeDammit
+    # Decoded the way BeautifulSoup decodes it, then handed to lxml as UTF-8
+    if isinstance(content, bytes):
+        content = UnicodeDammit(content, is_html=True).unicode_markup
+    try:
+        root = html.document_fromstring(content.encode('utf-8'), parser=html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError:
+        # Nothing to parse
+        return '', '', []
+    
+    title = next(root.iter('title'), None)
+    title = _lxml_string(title) if title is not None else ''
+    
+    # Try to find main content area
+    main_content = next(root.iter('main'), None)
+    if main_content is None:
+        main_content = next(root.iter('article'), None)
+    if main_content is None:
+        main_content = next((element for element in root.iter('div')
+                             if 'content' in (element.get('class') or '').split()), None)
+    if main_content is not None:
+        text, sections = sectionize(lxml_events(main_content))
+    else:
+        # Fallback: get all text from body
+        text, sections = sectionize(lxml_events(root))[0], []
+    return title, text, sections
+
+
+def _extract_soup(content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    title = soup.title.string if soup.title else ''
+    
+    # Try to find main content area
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+    if main_content:
+        text, sections = sectionize(soup_events(main_content, soup.builder.string_containers))
+    else:
+        # Fallback: get all text from body
+        text, sections = soup.get_text(separator='\n', strip=True), []
+    return title, text, sections
+
+
+def extract_page(content):
+    """(title, text, sections) of a web page
+    
+    The text and sections come from its main content area (main, article
+    or div.content). Pages without one give the text of the whole page
+    and no sections.
+    """
+    if _options["parser"] == "lxml":
+        return _extract_lxml(content)
+    return _extract_soup(content)
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Client
+Pooled keep-alive connections with retry and exponential backoff for all guideline scrapers
+"""
+
+import os
+import json
+import time
+import mmap
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# requests is slow to import, so it is imported when the first client is
+# created - a run that makes no requests never loads it
+
+# Status codes worth retrying - rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Response headers recorded in metadata files for conditional revalidation
+VALIDATOR_HEADERS = {
+    "etag": "ETag",
+    "last_modified": "Last-Modified",
+    "content_length": "Content-Length"
+}
+
+
+# Progress is written to the .part.json state file every this many bytes
+STATE_FLUSH_BYTES = 1024 * 1024
+
+# Files smaller than this are never split into parallel range segments
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# Read size for hashing files that are already on disk
+HASH_BUFFER_SIZE = 1024 * 1024
+
+DownloadResult = namedtuple("DownloadResult", ["path", "size", "sha256", "validators"])
+
+
+class RangeNotHonored(Exception):
+    """The server ignored a Range request or the file changed mid-download"""
+
+
+def hash_file(filepath, sha256_hash=None, length=None):
+    """SHA256 of a file on disk using a memory map (or large reads)
+    
+    Pass sha256_hash to continue an existing digest, and length to hash
+    only the first length bytes.
+    """
+    sha256_hash = sha256_hash or hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size if length is None else length
+        if size == 0:
+            return sha256_hash
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, size, HASH_BUFFER_SIZE):
+                    sha256_hash.update(mapped[start:min(start + HASH_BUFFER_SIZE, size)])
+        except (OSError, ValueError):
+            # mmap is unavailable for some files - fall back to buffered reads
+            f.seek(0)
+            remaining = size
+            while remaining > 0:
+                block = f.read(min(HASH_BUFFER_SIZE, remaining))
+                if not block:
+                    break
+                sha256_hash.update(block)
+                remaining -= len(block)
+    return sha256_hash
+
+
+def response_validators(response):
+    """Extract ETag / Last-Modified / Content-Length from a response"""
+    validators = {}
+    for key, header in VALIDATOR_HEADERS.items():
+        value = response.headers.get(header)
+        if value:
+            validators[key] = value
+    # A weak ETag on a compressed response says nothing about the length on disk
+    if response.headers.get("Content-Encoding"):
+        validators.pop("content_length", None)
+    return validators
+
+
+def compare_validators(old, new):
+    """Decide whether a resource changed - True/False, or None if undecidable"""
+    if not old or not new:
+        return None
+    if old.get("etag") and new.get("etag"):
+        return old["etag"] != new["etag"]
+    if old.get("last_modified") and new.get("last_modified"):
+        if old["last_modified"] != new["last_modified"]:
+            return True
+        # Same date but a different size still means a new file
+        if old.get("content_length") and new.get("content_length"):
+            return old["content_length"] != new["content_length"]
+        return False
+    if old.get("content_length") and new.get("content_length"):
+        if old["content_length"] != new["content_length"]:
+            return True
+    return None
+
+
+class HTTPClient:
+    def __init__(self, connect_timeout=10, read_timeout=60, retries=3, backoff_factor=1.0,
+                 pool_connections=10, pool_maxsize=10, download_segments=1, download_attempts=5):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.backoff_factor = backoff_factor
+        self.download_segments = download_segments
+        self.download_attempts = download_attempts
+        
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        
+        # One adapter per scheme keeps a pool of warm connections per host
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry
+        )
+        
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+    
+    def _timeout(self, timeout):
+        """Build a (connect, read) timeout - a bare number overrides the read timeout"""
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, (tuple, list)):
+            return tuple(timeout)
+        return (self.connect_timeout, timeout)
+    
+    def get(self, url, timeout=None, **kwargs):
+        """GET a URL over a pooled connection"""
+        return self.session.get(url, timeout=self._timeout(timeout), **kwargs)
+    
+    def head(self, url, timeout=None, **kwargs):
+        """HEAD a URL over a pooled connection"""
+        kwargs.setdefault("allow_redirects", True)
+        return self.session.head(url, timeout=self._timeout(timeout), **kwargs)
+    
+    def revalidate(self, url, validators, headers=None, timeout=None):
+        """Check whether url changed since validators were recorded
+        
+        Tries a HEAD request first, then a conditional GET that is closed
+        before the body is read. Returns (changed, validators) where changed
+        is True/False, or None when the server gives nothing to compare.
+        """
+        current = {}
+        
+        try:
+            response = self.head(url, headers=headers, timeout=timeout)
+            if response.ok:
+                current = response_validators(response)
+                changed = compare_validators(validators, current)
+                if changed is not None:
+                    return changed, current
+        except Exception as e:
+            print(f"HEAD request failed for {url}: {e}")
+        
+        if not validators:
+            return None, current
+        
+        conditional = dict(headers or {})
+        if validators.get("etag"):
+            conditional["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            conditional["If-Modified-Since"] = validators["last_modified"]
+        
+        try:
+            response = self.get(url, headers=conditional, timeout=timeout, stream=True)
+            try:
+                if response.status_code == 304:
+                    return False, validators
+                if response.ok:
+                    current = response_validators(response) or current
+                    return compare_validators(validators, current), current
+            finally:
+                response.close()
+        except Exception as e:
+            print(f"Conditional GET failed for {url}: {e}")
+        
+        return None, current
+    
+    def download(self, url, dest, headers=None, timeout=None, segments=None):
+        """Download url to dest, resuming from a .part file after dropped connections
+        
+        Progress is recorded in dest.part.json so a later call (or a later
+        run) continues with HTTP Range requests instead of starting over.
+        With segments > 1 and a server that accepts byte ranges, the file is
+        fetched as that many parallel range segments.
+        
+        The SHA256 is computed while streaming, so the returned result
+        carries the digest and byte count without a second read of the
+        file. Only resumed prefixes and parallel segments are hashed from disk.
+        """
+        dest = Path(dest)
+        part_file = dest.with_name(dest.name + ".part")
+        state_file = dest.with_name(dest.name + ".part.json")
+        segments = segments or self.download_segments
+        
+        state = self._load_part_state(url, part_file, state_file)
+        if state is None:
+            state = self._new_part_state(url, headers, timeout, segments)
+            with open(part_file, 'wb') as f:
+                if state["size"] is not None and len(state["segments"]) > 1:
+                    f.truncate(state["size"])
+        else:
+            print(f"Resuming download of {dest.name} ({self._part_progress(state)} bytes already fetched)")
+        
+        # Incremental digest for single-stream downloads, seeded with any resumed prefix
+        digest = None
+        if len(state["segments"]) == 1:
+            digest = {"sha256": hash_file(part_file, length=state["segments"][0]["offset"])}
+        
+        lock = threading.Lock()
+        try:
+            if len(state["segments"]) > 1:
+                with ThreadPoolExecutor(max_workers=len(state["segments"])) as pool:
+                    futures = [
+                        pool.submit(self._fetch_segment, url, headers, timeout, state, segment,
+                                    part_file, state_file, lock)
+                        for segment in state["segments"]
+                    ]
+                    for future in futures:
+                        future.result()
+            else:
+                self._fetch_segment(url, headers, timeout, state, state["segments"][0],
+                                    part_file, state_file, lock, digest)
+        except RangeNotHonored as e:
+            # Start over with a single plain stream
+            print(f"{e} - restarting download of {dest.name}")
+            state = {"url": url, "size": None, "validators": {},
+                     "segments": [{"start": 0, "end": None, "offset": 0}]}
+            open(part_file, 'wb').close()
+            digest = {"sha256": hashlib.sha256()}
+            self._fetch_segment(url, headers, timeout, state, state["segments"][0],
+                                part_file, state_file, lock, digest)
+        
+        size = self._part_progress(state)
+        with open(part_file, 'r+b') as f:
+            f.truncate(size)
+        
+        if digest is None:
+            # Parallel segments arrive out of order - hash the finished file once
+            digest = {"sha256": hash_file(part_file)}
+        
+        os.replace(part_file, dest)
+        if state_file.exists():
+            state_file.unlink()
+        
+        return DownloadResult(dest, size, digest["sha256"].hexdigest(), state["validators"])
+    
+    def _load_part_state(self, url, part_file, state_file):
+        """Load progress of an interrupted download of the same URL"""
+        if not part_file.exists() or not state_file.exists():
+            return None
+        try:
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("url") != url or not state.get("segments"):
+            return None
+        
+        # Never trust a recorded offset beyond what actually reached the disk
+        part_size = part_file.stat().st_size
+        for segment in state["segments"]:
+            segment["offset"] = min(segment["offset"], part_size)
+        return state
+    
+    def _new_part_state(self, url, headers, timeout, segments):
+        """Plan a fresh download - split into ranges when the server allows it"""
+        state = {"url": url, "size": None, "validators": {},
+                 "segments": [{"start": 0, "end": None, "offset": 0}]}
+        if segments <= 1:
+            return state
+        
+        try:
+            response = self.head(url, headers=headers, timeout=timeout)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Could not plan ranged download of {url}: {e}")
+            return state
+        
+        size = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        if not size or not accepts_ranges or response.headers.get("Content-Encoding"):
+            return state
+        
+        size = int(size)
+        state["size"] = size
+        state["validators"] = response_validators(response)
+        if size < MIN_SEGMENT_SIZE:
+            return state
+        
+        step = -(-size // segments)
+        state["segments"] = [
+            {"start": start, "end": min(start + step, size) - 1, "offset": start}
+            for start in range(0, size, step)
+        ]
+        return state
+    
+    def _part_progress(self, state):
+        """Total bytes fetched so far across all segments"""
+        return sum(segment["offset"] - segment["start"] for segment in state["segments"])
+    
+    def _save_part_state(self, state, state_file, lock):
+        """Record download progress so an interrupted download can resume"""
+        with lock:
+            temp_file = state_file.with_name(state_file.name + ".tmp")
+            with open(temp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(temp_file, state_file)
+    
+    def _fetch_segment(self, url, headers, timeout, state, segment, part_file, state_file, lock,
+                       digest=None):
+        """Fetch one byte range into the part file, retrying from the last offset
+        
+        digest holds a running sha256 updated with every byte written, for
+        single-stream downloads only.
+        """
+        import requests
+        attempt = 0
+        
+        while segment["end"] is None or segment["offset"] <= segment["end"]:
+            request_headers = dict(headers or {})
+            ranged = segment["offset"] > 0 or segment["end"] is not None
+            if ranged:
+                end = segment["end"] if segment["end"] is not None else ""
+                request_headers["Range"] = f"bytes={segment['offset']}-{end}"
+                # Only accept a partial response if the file is unchanged
+                if_range = state["validators"].get("etag") or state["validators"].get("last_modified")
+                if if_range:
+                    request_headers["If-Range"] = if_range
+            
+            try:
+                response = self.get(url, headers=request_headers, timeout=timeout, stream=True)
+                try:
+                    if response.status_code == 416 and segment["end"] is None:
+                        break  # Nothing left past the recorded offset
+                    response.raise_for_status()
+                    
+                    if ranged and response.status_code != 206:
+                        if len(state["segments"]) > 1 or segment["end"] is not None:
+                            raise RangeNotHonored(f"Server ignored byte range for {url}")
+                        # Full body instead of a resume - rewrite from the start
+                        segment["offset"] = 0
+                        with open(part_file, 'wb'):
+                            pass
+                        if digest is not None:
+                            digest["sha256"] = hashlib.sha256()
+                    
+                    if not state["validators"]:
+                        state["validators"] = response_validators(response)
+                    
+                    unsaved = 0
+                    with open(part_file, 'r+b') as f:
+                        f.seek(segment["offset"])
+                        for chunk in response.iter_content(chunk_size=65536):
+                            if segment["end"] is not None:
+                                chunk = chunk[:segment["end"] + 1 - segment["offset"]]
+                            f.write(chunk)
+                            if digest is not None:
+                                digest["sha256"].update(chunk)
+                            segment["offset"] += len(chunk)
+                            unsaved += len(chunk)
+                            if unsaved >= STATE_FLUSH_BYTES:
+                                f.flush()
+                                self._save_part_state(state, state_file, lock)
+                                unsaved = 0
+                finally:
+                    response.close()
+                
+                if segment["end"] is None:
+                    break  # Stream ran to completion
+                if segment["offset"] <= segment["end"]:
+                    raise requests.exceptions.ChunkedEncodingError("Connection closed before end of range")
+            
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                self._save_part_state(state, state_file, lock)
+                attempt += 1
+                if attempt >= self.download_attempts:
+                    raise
+                delay = self.backoff_factor * (2 ** (attempt - 1))
+                print(f"Download of {url} interrupted at byte {segment['offset']} ({e}) - "
+                      f"retrying in {delay:.0f}s")
+                time.sleep(delay)
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_options = {}
+_client_lock = threading.Lock()
+
+
+def configure_client(**options):
+    """Set options (timeouts, retries, pool sizes) for the shared client"""
+    global _client
+    with _client_lock:
+        _client_options.update(options)
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_client():
+    """Return the process-wide shared HTTP client"""
+    global _client, _client_pid
+    with _client_lock:
+        # Sockets must not be shared with forked worker processes
+        if _client is None or _client_pid != os.getpid():
+            _client = HTTPClient(**_client_options)
+            _client_pid = os.getpid()
+        return _client
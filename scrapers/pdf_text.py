@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+PDF Text Extraction
+Page-level text extraction for the PDF scrapers, optionally sharded across a process pool
+and backed by a persistent per-page cache
+"""
+
+import os
+import hashlib
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import guideline_compress
+
+# PyPDF2 is slow to import, so it is imported by the functions that
+# extract pages - a run that reuses every .txt never loads it
+
+# Bump when extraction output changes so cached pages are not reused
+EXTRACTOR_REVISION = 1
+
+# Shards per worker - several small shards keep the pool busy when page costs vary
+SHARDS_PER_JOB = 4
+
+# Largest shard - bounds the text a worker hands back at once
+MAX_SHARD_PAGES = 32
+
+# Shards submitted ahead of the page being yielded, per worker
+SHARDS_IN_FLIGHT = 2
+
+_extract_options = {"jobs": 1, "cache": True}
+
+
+def configure_extraction(**options):
+    """Set extraction options - jobs is the process count (0 = all cores), cache toggles the page cache"""
+    _extract_options.update(options)
+
+
+def extractor_version():
+    """PyPDF2 version and EXTRACTOR_REVISION - part of every page cache key"""
+    import PyPDF2
+    return f"PyPDF2-{PyPDF2.__version__}/{EXTRACTOR_REVISION}"
+
+
+def cache_enabled():
+    """Whether extracted text may be reused - off with --no-page-cache"""
+    return _extract_options.get("cache", True)
+
+
+def resolve_jobs(jobs=None):
+    """Turn a jobs setting into a worker count"""
+    if jobs is None:
+        jobs = _extract_options.get("jobs", 1)
+    if not jobs or jobs < 1:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+
+def page_marker(page_num):
+    """Marker written ahead of each page's text (page_num is 1-based)"""
+    return f"\n--- PAGE {page_num} ---\n"
+
+
+class PageCache:
+    """On-disk cache of extracted page text keyed by page content hash"""
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.font_hashes = {}
+        self.version = extractor_version()
+    
+    def page_key(self, page):
+        """Hash of a page's content streams and font maps plus the extractor version
+        
+        Returns None if the page cannot be hashed, in which case it is
+        always extracted.
+        """
+        import PyPDF2
+        try:
+            sha256_hash = hashlib.sha256(self.version.encode())
+            
+            contents = page.get("/Contents")
+            if contents is not None:
+                contents = contents.get_object()
+                streams = contents if isinstance(contents, PyPDF2.generic.ArrayObject) else [contents]
+                for stream in streams:
+                    sha256_hash.update(stream.get_object().get_data())
+            
+            # Text also depends on how each font maps glyphs to characters
+            resources = page.get("/Resources")
+            fonts = resources.get_object().get("/Font") if resources is not None else None
+            if fonts is not None:
+                for name, font in sorted(fonts.get_object().items()):
+                    sha256_hash.update(name.encode())
+                    sha256_hash.update(self._font_hash(font))
+            
+            return sha256_hash.hexdigest()
+        except Exception:
+            return None
+    
+    def _font_hash(self, font):
+        """Hash of a font's encoding and ToUnicode map, memoized per PDF object"""
+        ref = getattr(font, "idnum", None)
+        if ref is not None and ref in self.font_hashes:
+            return self.font_hashes[ref]
+        
+        font = font.get_object()
+        sha256_hash = hashlib.sha256()
+        sha256_hash.update(repr(font.get("/BaseFont")).encode())
+        sha256_hash.update(repr(font.get("/Encoding")).encode())
+        to_unicode = font.get("/ToUnicode")
+        if to_unicode is not None:
+            sha256_hash.update(to_unicode.get_object().get_data())
+        
+        digest = sha256_hash.digest()
+        if ref is not None:
+            self.font_hashes[ref] = digest
+        return digest
+    
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.txt"
+    
+    def contains(self, key):
+        return self._path(key).exists()
+    
+    def get(self, key):
+        """Cached text for a page key, or None"""
+        try:
+            with guideline_compress.open_text(self._path(key), newline='') as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, key, text):
+        """Store a page's text - failures only cost a re-extraction later"""
+        path = self._path(key)
+        temp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with guideline_compress.open_text(temp_file, 'w', newline='') as f:
+                f.write(text)
+            os.replace(temp_file, path)
+        except (OSError, UnicodeEncodeError):
+            if temp_file.exists():
+                temp_file.unlink()
+
+
+def _extract_page_list(pdf_path, page_nums):
+    """Extract the given pages in a worker process"""
+    import PyPDF2
+    with open(pdf_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [pdf_reader.pages[page_num].extract_text() for page_num in page_nums]
+
+
+def iter_pages(pdf_path, jobs=None, progress_every=100, cache_dir=None):
+    """Yield the text of every page, in page order, holding only a few pages at a time
+    
+    With cache_dir set, pages whose content hash is already cached are read
+    from the cache as they are reached instead of being extracted again, so
+    a re-downloaded handbook only pays for changed pages. With more than one
+    job the remaining pages are split into shards of at most MAX_SHARD_PAGES
+    that are extracted in a process pool. Only SHARDS_IN_FLIGHT shards per
+    worker run ahead of the page being yielded, and the output is identical
+    to a serial run.
+    """
+    import PyPDF2
+    jobs = resolve_jobs(jobs)
+    cache = PageCache(cache_dir) if cache_dir and cache_enabled() else None
+    
+    with open(pdf_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        total_pages = len(pdf_reader.pages)
+        print(f"Total pages: {total_pages}")
+        
+        keys = [None] * total_pages
+        cached = set()
+        if cache:
+            for page_num in range(total_pages):
+                keys[page_num] = cache.page_key(pdf_reader.pages[page_num])
+                if keys[page_num] and cache.contains(keys[page_num]):
+                    cached.add(page_num)
+            print(f"Page cache: reused {len(cached)}/{total_pages} pages, "
+                  f"extracting {total_pages - len(cached)}")
+        
+        missing = [page_num for page_num in range(total_pages) if page_num not in cached]
+        shards = []
+        if jobs > 1 and len(missing) >= 2:
+            shard_size = min(MAX_SHARD_PAGES, max(1, -(-len(missing) // (jobs * SHARDS_PER_JOB))))
+            shards = [missing[start:start + shard_size] for start in range(0, len(missing), shard_size)]
+            jobs = min(jobs, len(shards))
+            print(f"Extracting {len(shards)} page shards with {jobs} worker processes...")
+        
+        pool = ProcessPoolExecutor(max_workers=jobs) if shards else nullcontext()
+        with pool:
+            # Shards are submitted and collected in page order
+            pending = deque()
+            submitted = 0
+            extracted = {}
+            for page_num in range(total_pages):
+                text = cache.get(keys[page_num]) if page_num in cached else None
+                if text is None and shards and page_num not in cached:
+                    while submitted < len(shards) and len(pending) < jobs * SHARDS_IN_FLIGHT:
+                        shard = shards[submitted]
+                        pending.append((shard, pool.submit(_extract_page_list, str(pdf_path), shard)))
+                        submitted += 1
+                    while page_num not in extracted:
+                        shard, future = pending.popleft()
+                        extracted.update(zip(shard, future.result()))
+                    text = extracted.pop(page_num)
+                if text is None:
+                    # Not cached, or the cache entry vanished since it was checked
+                    text = pdf_reader.pages[page_num].extract_text()
+                if cache and keys[page_num] and page_num not in cached:
+                    cache.put(keys[page_num], text)
+                
+                if (page_num + 1) % progress_every == 0:
+                    print(f"Processed {page_num + 1}/{total_pages} pages...")
+                yield text
+
+
+def write_pages(pdf_path, text_file, jobs=None, progress_every=100, cache_dir=None):
+    """Stream every page's text, behind its page marker, to text_file
+    
+    The file holds the pages joined by newlines, as the scrapers always
+    wrote them, without the whole text being built in memory. It is
+    written under a temporary name and renamed into place when complete,
+    so a failed extraction leaves the previous text_file intact, and
+    compressed if compression is on. Returns the number of pages written.
+    """
+    text_file = Path(text_file)
+    temp_file = text_file.with_name(f"{text_file.name}.{os.getpid()}.tmp")
+    written = 0
+    try:
+        with guideline_compress.open_text(temp_file, 'w') as f:
+            pages = iter_pages(pdf_path, jobs=jobs, progress_every=progress_every, cache_dir=cache_dir)
+            for page_num, text in enumerate(pages):
+                if page_num:
+                    f.write("\n")
+                f.write(page_marker(page_num + 1))
+                f.write(text)
+                written += 1
+        os.replace(temp_file, text_file)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+    return written
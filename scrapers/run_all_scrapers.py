@@ -4,8 +4,14 @@ Master Scraper Script
 Runs all mortgage guideline scrapers and combines data
 """
 
+import os
 import sys
-import json
+import signal
+import sqlite3
+import time
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
 from datetime import datetime
 from pathlib import Path
 
@@ -15,135 +21,424 @@ from va_scraper import VAScraper
 from usda_scraper import USDAScraper
 from fannie_mae_scraper import FannieMaeScraper
 from freddie_mac_scraper import FreddieMacScraper
+from http_client import configure_client
+from pdf_text import configure_extraction
+from guideline_parser import export_passages
+from guideline_store import load_guidelines, load_index, export_index, prune_shards
+from guideline_db import build_database
+from scrape_metrics import peak_rss_bytes, save_metrics, save_prometheus
+from scrape_profile import configure_profiling, add_profile_arguments, profile_options, profile_stage
+from guideline_json import configure_serializer, serializer_options, pretty_enabled, dumps, save_ndjson
+from guideline_compress import configure_compression, compression_options, compressing, CODECS
+from html_text import configure_html, html_options, HTML_PARSERS
 
+# (result key, display name, scraper class) in run order
+SCRAPERS = [
+    ("fha", "FHA", FHAScraper),
+    ("va", "VA", VAScraper),
+    ("usda", "USDA", USDAScraper),
+    ("fannie_mae", "Fannie Mae", FannieMaeScraper),
+    ("freddie_mac", "Freddie Mac", FreddieMacScraper),
+]
 
-def run_all_scrapers(force_update=False):
-    """Run all scrapers and combine results"""
-    print("\n" + "=" * 80)
-    print("MORTGAGE AI 360 - GUIDELINE SCRAPER SUITE")
-    print("Powered by The Lawson Group")
-    print("=" * 80 + "\n")
-    
-    results = {}
-    errors = []
+# Default wall-clock limit for a single source when running with --jobs
+DEFAULT_SOURCE_TIMEOUT = 1800
+
+# Where the scrapers write their agency files and text shards
+GUIDELINES_DIR = Path("../guidelines")
+
+# How each source was obtained, as reported in the run summary
+REFRESH_LABELS = {
+    "fresh": "Fresh (no update check)",
+    "revalidated": "Revalidated (unchanged)",
+    "updated": "Fetched and parsed"
+}
+
+# Per-run timings and throughput, written next to the combined file
+METRICS_FILE = GUIDELINES_DIR / "scrape_metrics.json"
+PROMETHEUS_FILE = GUIDELINES_DIR / "scrape_metrics.prom"
+
+# One requirement record per line, written with --ndjson
+REQUIREMENTS_NDJSON_FILE = GUIDELINES_DIR / "combined_requirements.ndjson"
+
+
+def run_scraper(name, scraper_class, scrape_options=None):
+    """Run a single scraper and return (summary, error, metrics)
     
-    # Run FHA Scraper
-    print("\n[1/5] Running FHA Scraper...")
+    scrape_options are passed to scrape() (force_update, incremental).
+    The scraper has already saved its agency file, which the combine step
+    reads back, so only its summary is returned - for an unchanged source
+    it comes from the agency's manifest without loading the file. metrics are the
+    scraper's stage timings and counters, also for a failed run.
+    """
+    scraper = None
     try:
-        fha_scraper = FHAScraper()
-        fha_data = fha_scraper.scrape(force_update=force_update)
-        if fha_data:
-            results['fha'] = fha_data
-            print("✓ FHA scraping completed successfully")
-        else:
-            errors.append("FHA scraping failed")
-            print("✗ FHA scraping failed")
+        scraper = scraper_class()
+        summary = scraper.scrape(summary=True, **(scrape_options or {}))
+        if summary:
+            return summary, None, scraper.metrics()
+        return None, f"{name} scraping failed", scraper.metrics()
     except Exception as e:
-        errors.append(f"FHA scraper error: {str(e)}")
-        print(f"✗ FHA scraper error: {e}")
+        return None, f"{name} scraper error: {str(e)}", scraper.metrics() if scraper else {}
+
+
+def _scraper_worker(conn, name, scraper_class, scrape_options, http_options, extract_options,
+                    profiling_options, json_options, compress_options, page_options):
+    """Worker process entry point - sends (summary, error, metrics) back to the parent
     
-    # Run VA Scraper
-    print("\n[2/5] Running VA Scraper...")
+    The worker leads its own process group, so the --extract-jobs pool it
+    starts can be stopped along with it.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
     try:
-        va_scraper = VAScraper()
-        va_data = va_scraper.scrape(force_update=force_update)
-        if va_data:
-            results['va'] = va_data
-            print("✓ VA scraping completed successfully")
-        else:
-            errors.append("VA scraping failed")
-            print("✗ VA scraping failed")
-    except Exception as e:
-        errors.append(f"VA scraper error: {str(e)}")
-        print(f"✗ VA scraper error: {e}")
-    
-    # Run USDA Scraper
-    print("\n[3/5] Running USDA Scraper...")
+        configure_client(**http_options)
+        configure_extraction(**extract_options)
+        configure_profiling(**profiling_options)
+        configure_serializer(**json_options)
+        configure_compression(**compress_options)
+        configure_html(**page_options)
+        conn.send(run_scraper(name, scraper_class, scrape_options))
+    finally:
+        conn.close()
+
+
+def _stop_worker(process):
+    """Terminate a worker process and any extraction pool processes it started"""
     try:
-        usda_scraper = USDAScraper()
-        usda_data = usda_scraper.scrape(force_update=force_update)
-        if usda_data:
-            results['usda'] = usda_data
-            print("✓ USDA scraping completed successfully")
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError):
+        # No process groups here, or the worker has not started its own yet
+        process.terminate()
+    process.join()
+
+
+def run_scrapers_sequential(scrape_options=None):
+    """Run each scraper in turn in this process
+    
+    Every source shares the process, so its peak RSS is the run's peak so
+    far, not its own - it is recorded as cumulative_peak_rss_bytes.
+    """
+    outcomes = {}
+    
+    for index, (key, name, scraper_class) in enumerate(SCRAPERS, start=1):
+        print(f"\n[{index}/{len(SCRAPERS)}] Running {name} Scraper...")
+        started = time.monotonic()
+        summary, error, metrics = run_scraper(name, scraper_class, scrape_options)
+        metrics["wall_seconds"] = round(time.monotonic() - started, 4)
+        for field in ("peak_rss_bytes", "peak_child_rss_bytes"):
+            if field in metrics:
+                metrics[f"cumulative_{field}"] = metrics.pop(field)
+        outcomes[key] = (summary, error, metrics)
+        if error:
+            print(f"✗ {error}")
         else:
-            errors.append("USDA scraping failed")
-            print("✗ USDA scraping failed")
-    except Exception as e:
-        errors.append(f"USDA scraper error: {str(e)}")
-        print(f"✗ USDA scraper error: {e}")
+            print(f"✓ {name} scraping completed successfully")
+    
+    return outcomes
+
+
+def run_scrapers_concurrent(scrape_options=None, jobs=2, timeout=DEFAULT_SOURCE_TIMEOUT,
+                            http_options=None, extract_options=None, profiling_options=None):
+    """Run scrapers in a pool of worker processes with a per-source timeout"""
+    pending = list(SCRAPERS)
+    running = {}  # connection -> (key, name, process, started)
+    outcomes = {}
+    
+    print(f"\nRunning {len(SCRAPERS)} scrapers with {jobs} workers "
+          f"(timeout {timeout}s per source)...")
     
-    # Run Fannie Mae Scraper
-    print("\n[4/5] Running Fannie Mae Scraper...")
     try:
-        fannie_scraper = FannieMaeScraper()
-        fannie_data = fannie_scraper.scrape(force_update=force_update)
-        if fannie_data:
-            results['fannie_mae'] = fannie_data
-            print("✓ Fannie Mae scraping completed successfully")
-        else:
-            errors.append("Fannie Mae scraping failed")
-            print("✗ Fannie Mae scraping failed")
-    except Exception as e:
-        errors.append(f"Fannie Mae scraper error: {str(e)}")
-        print(f"✗ Fannie Mae scraper error: {e}")
+        while pending or running:
+            # Fill free worker slots
+            while pending and len(running) < jobs:
+                key, name, scraper_class = pending.pop(0)
+                parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=_scraper_worker,
+                    args=(child_conn, name, scraper_class, scrape_options or {},
+                          http_options or {}, extract_options or {}, profiling_options or {},
+                          serializer_options(), compression_options(), html_options()),
+                    name=f"scraper-{key}"
+                )
+                process.start()
+                child_conn.close()
+                running[parent_conn] = (key, name, process, time.monotonic())
+                print(f"→ Started {name} Scraper")
+            
+            # Wait until a worker reports back or the nearest deadline passes
+            now = time.monotonic()
+            next_deadline = min(started + timeout for _, _, _, started in running.values())
+            ready = wait(list(running), timeout=max(0, next_deadline - now))
+            
+            for conn in ready:
+                key, name, process, started = running.pop(conn)
+                try:
+                    summary, error, metrics = conn.recv()
+                except EOFError:
+                    summary, error, metrics = (
+                        None, f"{name} scraper exited unexpectedly (exit code {process.exitcode})", {})
+                conn.close()
+                process.join()
+                elapsed = time.monotonic() - started
+                metrics["wall_seconds"] = round(elapsed, 4)
+                outcomes[key] = (summary, error, metrics)
+                if error:
+                    print(f"✗ {error} ({elapsed:.1f}s)")
+                else:
+                    print(f"✓ {name} scraping completed successfully ({elapsed:.1f}s)")
+            
+            # Stop workers that have exceeded their wall-clock limit
+            now = time.monotonic()
+            for conn, (key, name, process, started) in list(running.items()):
+                if now - started >= timeout:
+                    del running[conn]
+                    _stop_worker(process)
+                    conn.close()
+                    outcomes[key] = (None, f"{name} scraper timed out after {timeout}s",
+                                     {"wall_seconds": round(now - started, 4)})
+                    print(f"✗ {name} scraper timed out after {timeout}s")
+    finally:
+        for conn, (key, name, process, started) in running.items():
+            _stop_worker(process)
+            conn.close()
+    
+    return outcomes
+
+
+def combined_entry(json_file):
+    """Combined-file entry for one source, read from its agency file
     
-    # Run Freddie Mac Scraper
-    print("\n[5/5] Running Freddie Mac Scraper...")
+    Sharded agency files contribute their index with one record per
+    passage; the server reads passage text from the shards by byte range.
+    Files from before the text was sharded are exported with it inline.
+    """
+    if "text" in load_index(json_file):
+        return export_index(json_file)
+    return export_passages(load_guidelines(json_file))
+
+
+def _nested_json(value, depth):
+    """Pretty JSON for a value nested depth levels deep in an indented document"""
+    # Newlines only occur between tokens - strings escape theirs
+    return dumps(value, pretty=True).replace(b"\n", b"\n" + b"  " * depth)
+
+
+def write_combined(combined_file, metadata, sources):
+    """Write the combined dataset one source at a time, then move it into place
+    
+    sources is a list of (key, json_file). Only one agency's entry is in
+    memory at once, and the file is assembled under a temporary name and
+    renamed over combined_file, so readers see the old file or the new one,
+    never a partial write. The output matches a single dump of the whole
+    dict - compact, or indented by 2 in pretty mode - and is compressed as
+    it is written if compression is on.
+    """
+    combined_file = Path(combined_file)
+    temp_file = combined_file.with_name(f"{combined_file.name}.{os.getpid()}.tmp")
+    pretty = pretty_enabled()
+    try:
+        with open(temp_file, 'wb') as raw:
+            with compressing(raw) as f:
+                if pretty:
+                    f.write(b'{\n  "metadata": ')
+                    f.write(_nested_json(metadata, 1))
+                    f.write(b',\n  "guidelines": {')
+                else:
+                    f.write(b'{"metadata":' + dumps(metadata) + b',"guidelines":{')
+                for number, (key, json_file) in enumerate(sources):
+                    f.write(b"," if number else b"")
+                    if pretty:
+                        f.write(b"\n    " + dumps(key) + b": " + _nested_json(combined_entry(json_file), 2))
+                    else:
+                        f.write(dumps(key) + b":" + dumps(combined_entry(json_file)))
+                if pretty:
+                    f.write(b"\n  }\n}" if sources else b"}\n}")
+                else:
+                    f.write(b"}}\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_file, combined_file)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+
+
+def combined_requirements(sources):
+    """One record per requirement entry of every source, with its source and category"""
+    for key, json_file in sources:
+        entry = combined_entry(json_file)
+        for category, records in entry.items():
+            if category == "passages" or not isinstance(records, list):
+                continue
+            for record in records:
+                if isinstance(record, dict) and "keyword" in record:
+                    yield {"source": key, "category": category, **record}
+
+
+def write_requirements_ndjson(ndjson_file, sources):
+    """Write combined_requirements as NDJSON, replacing ndjson_file atomically; returns the record count"""
+    ndjson_file = Path(ndjson_file)
+    temp_file = ndjson_file.with_name(f"{ndjson_file.name}.{os.getpid()}.tmp")
     try:
-        freddie_scraper = FreddieMacScraper()
-        freddie_data = freddie_scraper.scrape(force_update=force_update)
-        if freddie_data:
-            results['freddie_mac'] = freddie_data
-            print("✓ Freddie Mac scraping completed successfully")
+        count = save_ndjson(combined_requirements(sources), temp_file)
+        os.replace(temp_file, ndjson_file)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+    return count
+
+
+def run_all_scrapers(force_update=False, incremental=False, jobs=None,
+                     timeout=DEFAULT_SOURCE_TIMEOUT, http_options=None, extract_options=None,
+                     prometheus=False, profiling_options=None, max_age=None, ndjson=False):
+    """Run all scrapers and combine results
+    
+    With incremental set, a re-parsed source only re-runs requirement
+    extraction on pages that changed since the previous run. With jobs
+    set, scrapers run concurrently in up to that many worker processes
+    and any source running longer than timeout seconds is stopped.
+    http_options are passed to the shared HTTP client (timeouts, retries)
+    and extract_options to PDF text extraction (jobs, cache).
+    profiling_options turn on per-source, per-stage profiles (see
+    scrape_profile.configure_profiling).
+    
+    A source whose last update check is younger than max_age seconds
+    (default: each scraper's own max_age) is used without any request;
+    the rest are revalidated. The summary reports which path each took.
+    
+    With ndjson set, every requirement record is also written, one per
+    line, to combined_requirements.ndjson.
+    
+    Stage timings, throughput and peak memory of every source are saved
+    to scrape_metrics.json, and with prometheus set also to a
+    scrape_metrics.prom textfile for node_exporter.
+    """
+    run_started = time.monotonic()
+    print("\n" + "=" * 80)
+    print("MORTGAGE AI 360 - GUIDELINE SCRAPER SUITE")
+    print("Powered by The Lawson Group")
+    print("=" * 80 + "\n")
+    
+    if http_options:
+        configure_client(**http_options)
+    if extract_options:
+        configure_extraction(**extract_options)
+    if profiling_options:
+        configure_profiling(**profiling_options)
+    
+    scrape_options = {"force_update": force_update, "incremental": incremental}
+    if max_age is not None:
+        scrape_options["max_age"] = max_age
+    
+    if jobs:
+        outcomes = run_scrapers_concurrent(scrape_options=scrape_options, jobs=jobs, timeout=timeout,
+                                           http_options=http_options, extract_options=extract_options,
+                                           profiling_options=profiling_options)
+    else:
+        outcomes = run_scrapers_sequential(scrape_options=scrape_options)
+    
+    # Aggregate in the fixed source order regardless of completion order
+    results = {}
+    errors = []
+    source_metrics = {}
+    for key, name, scraper_class in SCRAPERS:
+        summary, error, metrics = outcomes.get(key, (None, f"{name} scraper did not run", {}))
+        if summary:
+            results[key] = summary
         else:
-            errors.append("Freddie Mac scraping failed")
-            print("✗ Freddie Mac scraping failed")
-    except Exception as e:
-        errors.append(f"Freddie Mac scraper error: {str(e)}")
-        print(f"✗ Freddie Mac scraper error: {e}")
+            errors.append(error)
+        source_metrics[key] = {"status": "ok" if summary else "failed", "error": error, **metrics}
     
     # Create combined dataset
     print("\n" + "=" * 80)
     print("Creating Combined Guideline Dataset...")
     print("=" * 80)
     
-    combined_data = {
-        "metadata": {
-            "created_at": datetime.now().isoformat(),
-            "version": "1.0",
-            "sources": list(results.keys()),
-            "total_sources": len(results),
-            "errors": errors
-        },
-        "guidelines": results
+    metadata = {
+        "created_at": datetime.now().isoformat(),
+        "version": "2.0",
+        "sources": list(results.keys()),
+        "total_sources": len(results),
+        "errors": errors
     }
     
-    # Save combined data
-    combined_file = Path("../guidelines/combined_guidelines.json")
-    with open(combined_file, 'w', encoding='utf-8') as f:
-        json.dump(combined_data, f, indent=2, ensure_ascii=False)
+    # Save combined data - each agency is read back from its own file in turn
+    combined_file = GUIDELINES_DIR / "combined_guidelines.json"
+    combine_started = time.monotonic()
+    with profile_stage("run", "combine", GUIDELINES_DIR / "profiles"):
+        write_combined(combined_file, metadata,
+                       [(key, GUIDELINES_DIR / f"{key}_guidelines.json") for key in results])
+    combine_seconds = time.monotonic() - combine_started
     
     print(f"\n✓ Combined guidelines saved to {combined_file}")
     
+    # The new combined file no longer points at earlier shard generations
+    pruned = sum(prune_shards(GUIDELINES_DIR / f"{key}_guidelines.json") for key in results)
+    if pruned:
+        print(f"✓ Removed {pruned} old text shards")
+    if ndjson:
+        count = write_requirements_ndjson(
+            REQUIREMENTS_NDJSON_FILE, [(key, GUIDELINES_DIR / f"{key}_guidelines.json") for key in results])
+        print(f"✓ {count} requirement records saved to {REQUIREMENTS_NDJSON_FILE}")
+    
+    # Refresh the SQLite store - agencies whose files are unchanged are skipped
+    print("\nUpdating guideline database...")
+    db_sources = [
+        (key, name, GUIDELINES_DIR / f"{key}_guidelines.json")
+        for key, name, scraper_class in SCRAPERS if key in results
+    ]
+    database_started = time.monotonic()
+    try:
+        with profile_stage("run", "database", GUIDELINES_DIR / "profiles"):
+            build_database(GUIDELINES_DIR / "guidelines.db", db_sources)
+        print(f"✓ Guideline database saved to {GUIDELINES_DIR / 'guidelines.db'}")
+    except sqlite3.Error as e:
+        print(f"Could not update guideline database: {e}")
+    database_seconds = time.monotonic() - database_started
+    
+    # Save run metrics
+    run_metrics = {
+        "created_at": metadata["created_at"],
+        "finished_at": round(time.time(), 3),
+        "jobs": jobs,
+        "run_seconds": round(time.monotonic() - run_started, 4),
+        "combine_seconds": round(combine_seconds, 4),
+        "database_seconds": round(database_seconds, 4),
+        "combined_bytes": combined_file.stat().st_size,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "peak_child_rss_bytes": peak_rss_bytes(children=True),
+        "sources": source_metrics
+    }
+    save_metrics(run_metrics, METRICS_FILE)
+    print(f"✓ Run metrics saved to {METRICS_FILE}")
+    if prometheus:
+        save_prometheus(run_metrics, PROMETHEUS_FILE)
+        print(f"✓ Prometheus metrics saved to {PROMETHEUS_FILE}")
+    
     # Create summary
     print("\n" + "=" * 80)
     print("SCRAPING SUMMARY")
     print("=" * 80)
-    print(f"Total Sources Scraped: {len(results)}/5")
+    print(f"Total Sources Scraped: {len(results)}/{len(SCRAPERS)}")
     print(f"Successful: {len(results)}")
     print(f"Failed: {len(errors)}")
+    for path, label in REFRESH_LABELS.items():
+        keys = [key for key, entry in source_metrics.items() if entry.get("refresh") == path]
+        if keys:
+            print(f"{label}: {', '.join(keys)}")
     
     if results:
         print("\nData Summary:")
-        for source, data in results.items():
+        for source, summary in results.items():
             print(f"\n{source.upper()}:")
-            print(f"  - Source: {data.get('source', 'N/A')}")
-            print(f"  - Last Updated: {data.get('last_updated', 'N/A')}")
+            print(f"  - Source: {summary['source']}")
+            print(f"  - Last Updated: {summary['last_updated']}")
             
             # Count requirements
-            income_count = len(data.get('income_requirements', []))
-            credit_count = len(data.get('credit_requirements', []))
-            dti_count = len(data.get('debt_to_income_ratios', []))
+            income_count = summary["counts"].get('income_requirements', 0)
+            credit_count = summary["counts"].get('credit_requirements', 0)
+            dti_count = summary["counts"].get('debt_to_income_ratios', 0)
             
             print(f"  - Income Requirements: {income_count}")
             print(f"  - Credit Requirements: {credit_count}")
@@ -158,19 +453,91 @@ def run_all_scrapers(force_update=False):
     print("Scraping process completed!")
     print("=" * 80 + "\n")
     
-    return combined_data
+    return {"metadata": metadata, "file": str(combined_file), "metrics": run_metrics}
 
 
 if __name__ == "__main__":
-    force_update = "--force" in sys.argv
+    parser = argparse.ArgumentParser(description="Run all mortgage guideline scrapers")
+    parser.add_argument("--force", action="store_true",
+                        help="re-download all guidelines")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-parse pages that changed since the previous run")
+    parser.add_argument("--jobs", type=int, default=None, metavar="N",
+                        help="run up to N scrapers concurrently in worker processes")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_SOURCE_TIMEOUT, metavar="SECONDS",
+                        help="per-source wall-clock limit when running with --jobs "
+                             f"(default: {DEFAULT_SOURCE_TIMEOUT})")
+    parser.add_argument("--http-timeout", type=float, default=None, metavar="SECONDS",
+                        help="read timeout for scraper HTTP requests")
+    parser.add_argument("--http-retries", type=int, default=None, metavar="N",
+                        help="retries with exponential backoff on transient HTTP errors")
+    parser.add_argument("--download-segments", type=int, default=None, metavar="N",
+                        help="fetch large PDFs as N parallel byte-range segments when the server allows it")
+    parser.add_argument("--extract-jobs", type=int, default=None, metavar="N",
+                        help="extract PDF pages with N worker processes (0 = one per CPU core)")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help="re-extract every PDF page instead of reusing guidelines/.page_cache")
+    parser.add_argument("--prometheus", action="store_true",
+                        help=f"also write the run metrics as a Prometheus textfile ({PROMETHEUS_FILE.name})")
+    parser.add_argument("--max-age", type=float, default=None, metavar="SECONDS",
+                        help="skip the update check of sources checked less than this long ago "
+                             "(default: 12 hours; 0 revalidates every source)")
+    parser.add_argument("--pretty", action="store_true",
+                        help="write indented JSON files for debugging (default: compact)")
+    parser.add_argument("--ndjson", action="store_true",
+                        help=f"also write every requirement record to {REQUIREMENTS_NDJSON_FILE.name}, one per line")
+    parser.add_argument("--compress", choices=CODECS, default=None,
+                        help="compress the text and JSON files written (zstd needs the zstandard package); "
+                             "compressed files are read transparently either way")
+    parser.add_argument("--compress-level", type=int, default=None, metavar="N",
+                        help="compression level (default: 10 for zstd, 6 for gzip)")
+    parser.add_argument("--html-parser", choices=HTML_PARSERS, default=None,
+                        help="parser for web pages (default: html.parser; lxml is faster but "
+                             "repairs malformed markup differently)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
     
-    if force_update:
+    if args.force:
         print("Force update mode enabled - will re-download all guidelines")
     
-    combined_data = run_all_scrapers(force_update=force_update)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    
+    http_options = {}
+    if args.http_timeout is not None:
+        http_options["read_timeout"] = args.http_timeout
+    if args.http_retries is not None:
+        http_options["retries"] = args.http_retries
+    if args.download_segments is not None:
+        http_options["download_segments"] = args.download_segments
+    
+    extract_options = {}
+    if args.extract_jobs is not None:
+        extract_options["jobs"] = args.extract_jobs
+    if args.no_page_cache:
+        extract_options["cache"] = False
+    
+    if args.pretty:
+        configure_serializer(pretty=True)
+    if args.compress:
+        try:
+            configure_compression(codec=args.compress, level=args.compress_level)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.html_parser:
+        try:
+            configure_html(parser=args.html_parser)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    combined = run_all_scrapers(force_update=args.force, incremental=args.incremental,
+                                jobs=args.jobs, timeout=args.timeout,
+                                http_options=http_options, extract_options=extract_options,
+                                prometheus=args.prometheus, profiling_options=profile_options(args),
+                                max_age=args.max_age, ndjson=args.ndjson)
     
     # Exit with appropriate code
-    if combined_data['metadata']['errors']:
+    if combined['metadata']['errors']:
         sys.exit(1)
     else:
         sys.exit(0)
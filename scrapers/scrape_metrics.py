@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Scrape Metrics
+Per-source stage timings, throughput and memory of a scraper run, saved as JSON and
+optionally as a Prometheus textfile next to combined_guidelines.json
+"""
+
+import os
+import sys
+from pathlib import Path
+import guideline_json
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Stages every source reports, in run order - a stage that did not run reports 0
+STAGES = ["check", "fetch", "extract", "parse", "persist"]
+
+# Prefix of every Prometheus metric name
+PROMETHEUS_PREFIX = "guideline_scrape"
+
+
+def peak_rss_bytes(children=False):
+    """Peak resident set size of this process, or of its largest finished child
+    
+    Returns None where the platform does not report it.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def rate(amount, seconds):
+    """amount per second, or None if nothing was timed"""
+    return round(amount / seconds, 2) if seconds > 0 else None
+
+
+def _write_atomic(path, text):
+    path = Path(path)
+    temp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_file, path)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+
+
+def save_metrics(metrics, metrics_file):
+    """Write the run's metrics as JSON"""
+    _write_atomic(metrics_file, guideline_json.dumps(metrics).decode('utf-8') + "\n")
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(metrics):
+    """The run's metrics in the Prometheus text exposition format"""
+    samples = {}  # name -> (help, [(labels, value)])
+    
+    def add(name, help_text, value, **labels):
+        if value is None:
+            return
+        samples.setdefault(name, (help_text, []))[1].append((labels, value))
+    
+    add("run_timestamp_seconds", "Unix time the run finished", metrics.get("finished_at"))
+    add("run_seconds", "Wall-clock seconds of the whole run", metrics.get("run_seconds"))
+    add("combine_seconds", "Seconds spent writing combined_guidelines.json", metrics.get("combine_seconds"))
+    add("database_seconds", "Seconds spent refreshing guidelines.db", metrics.get("database_seconds"))
+    add("combined_bytes", "Size of combined_guidelines.json", metrics.get("combined_bytes"))
+    add("peak_rss_bytes", "Peak resident set size of the run", metrics.get("peak_rss_bytes"))
+    add("peak_child_rss_bytes", "Peak resident set size of the largest worker process",
+        metrics.get("peak_child_rss_bytes"))
+    
+    for source, entry in metrics.get("sources", {}).items():
+        add("source_success", "1 if the source scraped successfully, else 0",
+            1 if entry.get("status") == "ok" else 0, source=source)
+        add("source_seconds", "Wall-clock seconds of the source", entry.get("wall_seconds"), source=source)
+        if entry.get("refresh"):
+            add("source_refresh", "1 for how the source was obtained: fresh, revalidated or updated",
+                1, source=source, path=entry["refresh"])
+        add("source_check_age_seconds", "Age of the source's previous update check",
+            entry.get("check_age_seconds"), source=source)
+        for stage, seconds in entry.get("stage_seconds", {}).items():
+            add("stage_seconds", "Wall-clock seconds spent in each scraper stage",
+                seconds, source=source, stage=stage)
+        add("downloaded_bytes", "Bytes downloaded for the source", entry.get("bytes_downloaded"), source=source)
+        add("extracted_pages", "PDF pages extracted", entry.get("pages_extracted"), source=source)
+        add("extract_pages_per_second", "PDF pages extracted per second of the extract stage",
+            entry.get("pages_per_sec"), source=source)
+        add("parsed_bytes", "UTF-8 bytes of text parsed", entry.get("text_bytes"), source=source)
+        add("parse_bytes_per_second", "Bytes parsed per second of the parse stage",
+            entry.get("parse_bytes_per_sec"), source=source)
+        add("index_bytes", "Size of the saved agency index", entry.get("index_bytes"), source=source)
+        for category, count in entry.get("matches", {}).items():
+            add("matches", "Requirement entries found per category", count, source=source, category=category)
+        add("source_peak_rss_bytes", "Peak resident set size of the worker process that ran the source (--jobs)",
+            entry.get("peak_rss_bytes"), source=source)
+        add("source_peak_child_rss_bytes", "Peak resident set size of the source's largest extraction worker",
+            entry.get("peak_child_rss_bytes"), source=source)
+        add("source_cumulative_peak_rss_bytes",
+            "Peak resident set size of the run so far when the source finished, without --jobs",
+            entry.get("cumulative_peak_rss_bytes"), source=source)
+        add("source_cumulative_peak_child_rss_bytes",
+            "Peak resident set size of the largest extraction worker so far when the source finished, without --jobs",
+            entry.get("cumulative_peak_child_rss_bytes"), source=source)
+    
+    lines = []
+    for name, (help_text, values) in samples.items():
+        full_name = f"{PROMETHEUS_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} gauge")
+        for labels, value in values:
+            label_text = ",".join(f'{key}="{_label_value(label)}"' for key, label in labels.items())
+            lines.append(f"{full_name}{{{label_text}}} {value}" if label_text else f"{full_name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def save_prometheus(metrics, prom_file):
+    """Write the run's metrics as a node_exporter textfile - replaced atomically so it is never read half-written"""
+    _write_atomic(prom_file, prometheus_text(metrics))
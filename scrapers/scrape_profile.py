@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Scrape Profiling
+Optional per-source, per-stage profiles of a scraper run - deterministic cProfile
+stats saved as .pstats, or a low-overhead stack sampler - with a hotspot summary
+"""
+
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+# "cprofile" traces every call (accurate, slows a run down noticeably);
+# "sample" looks at the running stack every interval seconds (cheap enough to leave on)
+PROFILE_MODES = ["cprofile", "sample"]
+
+# Seconds between stack samples in sample mode
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+# Profiling settings - mode None is off
+_options = {"mode": None, "output_dir": None, "top": 20, "interval": DEFAULT_SAMPLE_INTERVAL}
+
+
+def configure_profiling(**options):
+    """Set the profiling mode, output directory, hotspots listed and sample interval"""
+    _options.update(options)
+
+
+def add_profile_arguments(parser):
+    """Add the --profile options to a scraper's argument parser"""
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILE_MODES, default=None,
+                        help="profile each stage of each source: cprofile (default) writes .pstats files, "
+                             "sample records stacks with little overhead")
+    parser.add_argument("--profile-dir", default=None, metavar="DIR",
+                        help="where profiles are written (default: guidelines/profiles)")
+    parser.add_argument("--profile-top", type=int, default=20, metavar="N",
+                        help="hotspots listed in each profile summary (default: 20)")
+    parser.add_argument("--profile-interval", type=float, default=DEFAULT_SAMPLE_INTERVAL, metavar="SECONDS",
+                        help=f"seconds between stack samples with --profile sample "
+                             f"(default: {DEFAULT_SAMPLE_INTERVAL})")
+
+
+def profile_options(args):
+    """configure_profiling options from parsed --profile arguments"""
+    if not args.profile:
+        return {}
+    return {"mode": args.profile, "output_dir": args.profile_dir, "top": args.profile_top,
+            "interval": args.profile_interval}
+
+
+def _location(filename, line, name):
+    return f"{Path(filename).name}:{line}({name})" if line else name
+
+
+class StackSampler:
+    """Records the stack of the thread that enabled it every interval seconds
+    
+    Sampling runs in a background thread, so the profiled code runs at full
+    speed; the cost is one stack walk per interval. Work done in other
+    processes (such as an extraction pool) is not seen.
+    """
+    
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()  # (outermost, ..., innermost) -> samples
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        self.thread_id = None
+    
+    def enable(self):
+        self.thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+    
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+    
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_location(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+    
+    def save(self, path):
+        """Write collapsed stacks ("outer;inner count" lines) for flame graph tools"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+    
+    def hotspots(self, top):
+        """[(location, self samples, total samples)] of the functions most often running"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for location in set(stack):
+                total[location] += count
+        return [(location, count, total[location]) for location, count in own.most_common(top)]
+
+
+def _cprofile_summary(profiler, top):
+    """Lines listing the functions with the most time of their own"""
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    lines = [f"{'own s':>9} {'total s':>9} {'calls':>10}  function"]
+    for (filename, line, name), (_, calls, own, total, _) in ranked:
+        lines.append(f"{own:>9.3f} {total:>9.3f} {calls:>10}  {_location(filename, line, name)}")
+    return lines
+
+
+def _sample_summary(sampler, top):
+    lines = [f"{'own %':>7} {'total %':>7}  function ({sampler.samples} samples)"]
+    for location, own, total in sampler.hotspots(top):
+        lines.append(f"{100 * own / sampler.samples:>7.1f} {100 * total / sampler.samples:>7.1f}  {location}")
+    return lines
+
+
+@contextmanager
+def profile_stage(source, stage, default_dir):
+    """Profile the enclosed block as source's stage, if profiling is on
+    
+    cprofile mode writes <source>.<stage>.pstats (load several with
+    pstats.Stats to see a whole source); sample mode writes collapsed
+    stacks to <source>.<stage>.stacks. Either way the top hotspots are
+    printed and saved to <source>.<stage>.txt.
+    """
+    mode = _options["mode"]
+    if mode is None:
+        yield
+        return
+    
+    # The profilers are only imported once profiling is on
+    import cProfile
+    output_dir = Path(_options["output_dir"] or default_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile() if mode == "cprofile" else StackSampler(_options["interval"])
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        
+        stem = output_dir / f"{source}.{stage}"
+        if mode == "cprofile":
+            profile_file = stem.with_name(stem.name + ".pstats")
+            profiler.dump_stats(profile_file)
+            lines = _cprofile_summary(profiler, _options["top"])
+        else:
+            profile_file = stem.with_name(stem.name + ".stacks")
+            profiler.save(profile_file)
+            lines = _sample_summary(profiler, _options["top"]) if profiler.samples else ["No samples taken"]
+        
+        heading = f"Profile of {source} {stage} ({mode}, {elapsed:.2f}s) - {profile_file}"
+        with open(stem.with_name(stem.name + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join([heading] + lines) + "\n")
+        print(heading)
+        for line in lines:
+            print(f"  {line}")
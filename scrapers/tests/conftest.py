@@ -0,0 +1,6 @@
+"""The scrapers are flat modules run from scrapers/ - make them importable here"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
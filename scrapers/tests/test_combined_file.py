@@ -0,0 +1,85 @@
+"""The combined file is assembled one agency at a time into exactly one dump of the whole dict"""
+
+import io
+import contextlib
+import pytest
+import guideline_json
+import guideline_compress
+from guideline_parser import update_requirements, REQUIREMENT_FORMAT
+from guideline_store import save_guidelines
+from run_all_scrapers import write_combined, combined_entry
+
+PATTERNS = {"income_requirements": [r"stable income"]}
+
+TEXT = "".join(
+    f"\n--- PAGE {number} ---\nThe borrower’s stable income must be verified. {'Filler text. ' * 100}"
+    for number in range(1, 6)
+)
+
+METADATA = {"last_updated": "2026-10-18T00:00:00", "sources": ["FHA", "Fannie Mae"]}
+
+
+@pytest.fixture
+def sources(tmp_path):
+    """A sharded agency file and one from before the text was sharded"""
+    json_file = tmp_path / "fha_guidelines.json"
+    with contextlib.redirect_stdout(io.StringIO()):
+        requirements, _, _ = update_requirements(TEXT, PATTERNS, json_file, tmp_path / "fha_page_index.json")
+    save_guidelines({"source": "FHA", "requirement_format": REQUIREMENT_FORMAT, "full_text": TEXT,
+                     **requirements}, json_file)
+    legacy_file = tmp_path / "fannie_mae_guidelines.json"
+    guideline_json.save({
+        "source": "Fannie Mae",
+        "full_text": "Stable income.",
+        "income_requirements": [{"keyword": "income", "context": "Stable income."}]
+    }, legacy_file)
+    return [("fha", json_file), ("fannie_mae", legacy_file)]
+
+
+def _expected(sources):
+    return {"metadata": METADATA, "guidelines": {key: combined_entry(json_file) for key, json_file in sources}}
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_write_combined_matches_single_dump(tmp_path, sources, pretty):
+    combined_file = tmp_path / "combined_guidelines.json"
+    combined_file.write_text("previous")
+    options = guideline_json.serializer_options()
+    guideline_json.configure_serializer(pretty=pretty)
+    try:
+        write_combined(combined_file, METADATA, sources)
+        expected = guideline_json.dumps(_expected(sources))
+    finally:
+        guideline_json.configure_serializer(**options)
+    
+    data = combined_file.read_bytes()
+    assert data.rstrip(b"\n") == expected
+    combined = guideline_json.loads(data)
+    assert combined == _expected(sources)
+    assert "text" in combined["guidelines"]["fha"]
+    assert combined["guidelines"]["fannie_mae"]["income_requirements"][0]["keyword"] == "income"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_write_combined_without_sources(tmp_path, pretty):
+    combined_file = tmp_path / "combined_guidelines.json"
+    options = guideline_json.serializer_options()
+    guideline_json.configure_serializer(pretty=pretty)
+    try:
+        write_combined(combined_file, METADATA, [])
+    finally:
+        guideline_json.configure_serializer(**options)
+    assert guideline_json.load(combined_file) == {"metadata": METADATA, "guidelines": {}}
+
+
+def test_write_combined_compressed(tmp_path, sources):
+    combined_file = tmp_path / "combined_guidelines.json"
+    options = guideline_compress.compression_options()
+    guideline_compress.configure_compression(codec="gzip")
+    try:
+        write_combined(combined_file, METADATA, sources)
+    finally:
+        guideline_compress.configure_compression(**options)
+    assert guideline_compress.codec_of(combined_file.read_bytes()) == "gzip"
+    assert guideline_json.load(combined_file) == _expected(sources)
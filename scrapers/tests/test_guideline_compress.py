@@ -0,0 +1,66 @@
+"""Files written with each codec are recognised by their leading bytes and read back unchanged"""
+
+import pytest
+import guideline_compress
+from guideline_compress import codec_of, open_write, open_read, open_text, compress, decompress, read_bytes
+from guideline_store import TextWriter, TextShards
+
+CODECS = [
+    None,
+    "gzip",
+    pytest.param("zstd", marks=pytest.mark.skipif(
+        guideline_compress.zstandard is None, reason="zstandard is not installed")),
+]
+
+DATA = ("Borrower’s stable income – verified ✓\n" * 2000).encode('utf-8')
+
+
+@pytest.fixture
+def codec(request):
+    """Compression configured with the parametrized codec for the test, then restored"""
+    options = guideline_compress.compression_options()
+    guideline_compress.configure_compression(codec=request.param)
+    yield request.param
+    guideline_compress.configure_compression(**options)
+
+
+@pytest.mark.parametrize("codec", CODECS, indirect=True)
+def test_files_round_trip(tmp_path, codec):
+    path = tmp_path / "data.txt"
+    with open_write(path) as f:
+        f.write(DATA)
+    raw = path.read_bytes()
+    assert codec_of(raw) == codec
+    assert (raw == DATA) == (codec is None)
+    
+    with open_read(path) as f:
+        assert f.read() == DATA
+    assert read_bytes(path) == DATA
+    with open_text(path, newline='') as f:
+        assert f.read() == DATA.decode('utf-8')
+    
+    assert codec_of(compress(DATA)) == codec
+    assert decompress(compress(DATA)) == DATA
+
+
+def test_plain_data_has_no_codec():
+    assert codec_of(b'{"source": "FHA"}') is None
+    assert codec_of(b"") is None
+    assert codec_of(DATA) is None
+    assert decompress(DATA) is DATA
+
+
+@pytest.mark.parametrize("codec", CODECS, indirect=True)
+def test_shards_read_by_uncompressed_offsets(tmp_path, codec):
+    json_file = tmp_path / "test_guidelines.json"
+    text = DATA.decode('utf-8')
+    writer = TextWriter(json_file)
+    writer.write(text)
+    table = writer.close().table
+    
+    shard_file = tmp_path / table["shards"][0]["file"]
+    assert codec_of(shard_file.read_bytes()) == codec
+    assert table["bytes"] == len(DATA)
+    with TextShards(json_file, {"text": table}) as shards:
+        assert shards.read_bytes(0, len(DATA)) == DATA
+        assert shards.read_bytes(1000, 1100) == DATA[1000:1100]
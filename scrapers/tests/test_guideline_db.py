@@ -0,0 +1,109 @@
+"""The SQLite store holds each agency file's passages and finds them by full-text search"""
+
+import io
+import sqlite3
+import contextlib
+import pytest
+from guideline_parser import update_requirements, REQUIREMENT_FORMAT
+from guideline_store import save_guidelines
+from guideline_db import build_database, search_passages, query_terms
+
+PATTERNS = {"income_requirements": [r"qualifying income"]}
+
+# Keeps each page's passage apart from the next page's
+FILLER = "The appraisal describes the property and its condition. " * 30
+
+# Words after each page's match, inside its context window
+PAGES = {
+    "fha": [
+        "Overtime counts when overtime has a two year overtime history.",
+        "Overtime and bonus pay need a written verification.",
+        "Bonus and commission pay need tax returns.",
+        "Rental receipts need a signed lease.",
+        "Alimony needs a court order.",
+        "Retirement needs award letters.",
+        "Disability needs a benefit statement.",
+        "Tips need a year to date record.",
+    ],
+    "va": [
+        "Overtime needs a twelve month history.",
+        "Residual needs the regional table.",
+    ],
+}
+
+
+def _source(tmp_path, key):
+    text = "".join(
+        f"\n--- PAGE {number} ---\nThe qualifying income rule. {words} {FILLER}"
+        for number, words in enumerate(PAGES[key], 1)
+    )
+    json_file = tmp_path / f"{key}_guidelines.json"
+    with contextlib.redirect_stdout(io.StringIO()):
+        requirements, _, _ = update_requirements(text, PATTERNS, json_file, tmp_path / f"{key}_page_index.json")
+    save_guidelines({"source": key.upper(), "requirement_format": REQUIREMENT_FORMAT, "full_text": text,
+                     **requirements}, json_file)
+    return key, key.upper(), json_file
+
+
+@pytest.fixture
+def db(tmp_path):
+    sources = [_source(tmp_path, "fha"), _source(tmp_path, "va")]
+    db_path = tmp_path / "guidelines.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert build_database(db_path, sources) == ["fha", "va"]
+    return db_path, sources
+
+
+def test_build_database_stores_passages(db):
+    db_path, sources = db
+    conn = sqlite3.connect(str(db_path))
+    try:
+        counts = dict(conn.execute(
+            "SELECT s.key, COUNT(*) FROM passages p JOIN sources s ON s.id = p.source_id GROUP BY s.key"))
+        pages = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    finally:
+        conn.close()
+    assert counts == {key: len(PAGES[key]) for key in PAGES}
+    assert pages == sum(map(len, PAGES.values()))
+    
+    # Unchanged files are skipped; force rebuilds them
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert build_database(db_path, sources) == []
+        assert build_database(db_path, sources[:1], force=True) == ["fha"]
+
+
+def test_search_passages_filters(db):
+    db_path, _ = db
+    hits = search_passages(db_path, "overtime history")
+    assert [(hit["source"], hit["page"]) for hit in sorted(hits, key=lambda hit: hit["source"])] == [
+        ("fha", 1), ("va", 1)]
+    for hit in hits:
+        assert set(hit) == {"source", "page", "categories", "keywords", "text", "score"}
+        assert hit["categories"] == ["income_requirements"]
+        assert hit["keywords"] == ["qualifying income"]
+        assert "overtime" in hit["text"].lower()
+    
+    assert [hit["source"] for hit in search_passages(db_path, "overtime history", source="va")] == ["va"]
+    assert search_passages(db_path, "overtime", category="credit_requirements") == []
+
+
+def test_search_passages_ranks_by_bm25(db):
+    db_path, _ = db
+    # Three mentions of overtime outrank one
+    hits = search_passages(db_path, "overtime", source="fha")
+    assert [hit["page"] for hit in hits] == [1, 2]
+    assert hits[0]["score"] > hits[1]["score"] > 0
+    
+    # Any word may match; a passage with both words beats one with either
+    hits = search_passages(db_path, "overtime bonus", source="fha", match_all=False)
+    assert [hit["page"] for hit in hits][:1] == [2]
+    assert sorted(hit["page"] for hit in hits) == [1, 2, 3]
+    assert [hit["score"] for hit in hits] == sorted((hit["score"] for hit in hits), reverse=True)
+    assert search_passages(db_path, "overtime bonus", source="fha") == hits[:1]
+    assert len(search_passages(db_path, "overtime bonus", match_all=False, limit=2)) == 2
+
+
+def test_query_terms_drop_noise(db):
+    db_path, _ = db
+    assert query_terms("W2_2023.pdf Paystub-final.PDF VA loan") == ["w2", "paystub", "va"]
+    assert search_passages(db_path, "scan.pdf 2023") == []
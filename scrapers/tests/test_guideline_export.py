@@ -0,0 +1,72 @@
+"""Span-format guidelines export to the record shapes the combined file and server read"""
+
+import io
+import contextlib
+from pathlib import Path
+from guideline_parser import (
+    update_requirements, export_legacy, export_passages, requirement_context, REQUIREMENT_FORMAT,
+    MAX_PASSAGE_CHARS
+)
+
+PATTERNS = {
+    "income_requirements": [r"stable income"],
+    "credit_requirements": [r"credit score"],
+}
+
+PAGE = (
+    "The borrower’s stable income must be verified. "
+    "A minimum credit score of 580 applies. "
+    + "Filler text about the property and its appraisal. " * 20
+)
+
+TEXT = "".join(f"\n--- PAGE {number} ---\n{PAGE}" for number in range(1, 11))
+
+
+def _guidelines(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        requirements, _, _ = update_requirements(
+            TEXT, PATTERNS, Path(tmp_path) / "test_guidelines.json", Path(tmp_path) / "test_page_index.json")
+    return {"source": "Test", "requirement_format": REQUIREMENT_FORMAT, "full_text": TEXT, **requirements}
+
+
+def test_export_legacy_records(tmp_path):
+    guidelines = _guidelines(tmp_path)
+    guidelines["notes"] = [{"keyword": "legacy", "context": "kept as stored"}]
+    exported = export_legacy(guidelines)
+    
+    assert "requirement_format" not in exported
+    assert exported["source"] == "Test" and exported["full_text"] == TEXT
+    assert exported["notes"] == guidelines["notes"]
+    for category, keyword in [("income_requirements", "stable income"), ("credit_requirements", "credit score")]:
+        records = exported[category]
+        assert len(records) == len(guidelines[category]) == 10
+        for record, span in zip(records, guidelines[category]):
+            assert record == {"keyword": keyword, "context": requirement_context(TEXT, span)}
+
+
+def test_export_passages_records(tmp_path):
+    guidelines = _guidelines(tmp_path)
+    exported = export_passages(guidelines)
+    
+    assert "passages" not in exported and "requirement_format" not in exported
+    passages = guidelines["passages"]
+    assert 1 < len(passages) < 20
+    for category in PATTERNS:
+        records = exported[category]
+        assert len(records) == sum(category in passage["categories"] for passage in passages)
+        for record in records:
+            assert set(record) == {"keyword", "keywords", "context", "categories", "page"}
+            assert category in record["categories"]
+            assert record["keyword"] == record["keywords"][0]
+            assert set(record["keywords"]) <= {"stable income", "credit score"}
+            assert all(keyword in record["context"] for keyword in record["keywords"])
+            assert len(record["context"]) <= MAX_PASSAGE_CHARS
+    
+    # Every match's context window falls inside one of its category's passages
+    contexts = [record["context"] for record in exported["income_requirements"]]
+    for span in guidelines["income_requirements"]:
+        assert any(requirement_context(TEXT, span) in context for context in contexts)
+    
+    # Without passages the legacy records are exported instead
+    del guidelines["passages"]
+    assert export_passages(guidelines) == export_legacy(guidelines)
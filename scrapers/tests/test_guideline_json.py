@@ -0,0 +1,69 @@
+"""JSON and NDJSON files read back the values they were written with, on either backend"""
+
+import json
+import pytest
+import guideline_json
+import guideline_compress
+from guideline_json import dumps, loads, save, load, save_ndjson, iter_ndjson
+
+BACKENDS = [
+    pytest.param("orjson", marks=pytest.mark.skipif(guideline_json.orjson is None, reason="orjson is not installed")),
+    "json",
+]
+
+VALUE = {
+    "source": "VA",
+    "income_requirements": [{"start": 12, "end": 18, "page": 0}],
+    "text": "Borrower’s income – ✓",
+    "big": 1 << 70,
+    "surrogate": "\ud800",
+}
+
+RECORDS = [
+    {"source": "FHA", "category": "income_requirements", "keyword": "income", "page": 3},
+    {"source": "VA", "category": "credit_requirements", "keyword": "crédit\nscore", "page": None},
+]
+
+
+@pytest.fixture
+def backend(request):
+    """Serializer configured with the parametrized backend for the test, then restored"""
+    options = guideline_json.serializer_options()
+    guideline_json.configure_serializer(backend=request.param)
+    yield request.param
+    guideline_json.configure_serializer(**options)
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_dumps_round_trip(backend):
+    compact = dumps(VALUE, pretty=False)
+    assert b"\n" not in compact and "✓".encode('utf-8') in compact
+    assert loads(compact) == VALUE
+    assert loads(dumps(VALUE, pretty=True)) == VALUE
+    assert json.loads(dumps(RECORDS, pretty=True)) == RECORDS
+
+
+@pytest.mark.parametrize("backend", BACKENDS, indirect=True)
+def test_save_replaces_file(tmp_path, backend):
+    path = tmp_path / "guidelines.json"
+    save({"old": True}, path)
+    save(VALUE, path)
+    assert load(path) == VALUE
+    assert [child.name for child in tmp_path.iterdir()] == ["guidelines.json"]
+
+
+@pytest.mark.parametrize("codec", [None, "gzip"])
+def test_ndjson_round_trip(tmp_path, codec):
+    options = guideline_compress.compression_options()
+    guideline_compress.configure_compression(codec=codec)
+    try:
+        path = tmp_path / "requirements.ndjson"
+        assert save_ndjson(iter(RECORDS), path) == len(RECORDS)
+    finally:
+        guideline_compress.configure_compression(**options)
+    
+    if codec is None:
+        lines = path.read_bytes().splitlines()
+        assert len(lines) == len(RECORDS)
+        assert [json.loads(line) for line in lines] == RECORDS
+    assert list(iter_ndjson(path)) == RECORDS
@@ -0,0 +1,68 @@
+"""Peak memory of parsing and loading a long handbook stays flat as the text grows"""
+
+import io
+import tracemalloc
+import contextlib
+from pathlib import Path
+import pytest
+from va_scraper import VAScraper
+import guideline_json
+from guideline_store import TextWriter, save_guidelines, load_guidelines
+from guideline_parser import update_requirements, REQUIREMENT_FORMAT
+
+CORPUS_DIR = Path(__file__).resolve().parents[2] / "guidelines"
+
+# Times the VA text the padded handbook is long - about 11 MB
+PADDING = 8
+
+# Peak traced allocations allowed for a full parse, a load and an
+# incremental parse of the padded text (about 9 MB when streamed) -
+# decoding the text whole even once would add its 11 MB on top
+PEAK_CEILING = 16 << 20
+
+FILLER_PAGE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n" * 50
+
+
+def _padded_va_text(json_file):
+    """ShardedText of the VA handbooks followed by match-free pages, and its size in bytes"""
+    writer = TextWriter(json_file)
+    for document in VAScraper.documents:
+        text_file = CORPUS_DIR / Path(document.filename).with_suffix('.txt')
+        if not text_file.exists():
+            pytest.skip(f"{text_file.name} is not in the corpus")
+        writer.write_file(text_file)
+    target = writer.bytes * PADDING
+    page = 0
+    while writer.bytes < target:
+        page += 1
+        writer.write(f"\n--- PAGE {page} ---\n{FILLER_PAGE}")
+    return writer.close(), writer.bytes
+
+
+def test_parse_and_load_peak_memory(tmp_path):
+    json_file = tmp_path / "va_guidelines.json"
+    index_file = tmp_path / "va_page_index.json"
+    text, size = _padded_va_text(json_file)
+    patterns = VAScraper.category_patterns
+    
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            guidelines = {"source": "VA", "requirement_format": REQUIREMENT_FORMAT, "full_text": text}
+            requirements, page_index, _ = update_requirements(text, patterns, json_file, index_file)
+            guidelines.update(requirements)
+            save_guidelines(guidelines, json_file)
+            guideline_json.save(page_index, index_file)
+            text.close()
+            
+            loaded = load_guidelines(json_file)
+            again, _, _ = update_requirements(loaded["full_text"], patterns, json_file, index_file,
+                                              incremental=True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert size > 8 << 20
+    assert sum(len(guidelines[category]) for category in patterns) > 0
+    assert all(again[category] == guidelines[category] for category in patterns)
+    assert peak < PEAK_CEILING, f"peak {peak / 1e6:.1f} MB for {size / 1e6:.1f} MB of text"
@@ -0,0 +1,72 @@
+"""PatternMatcher.scan and StreamParser against one re.finditer per pattern on the committed corpus"""
+
+from pathlib import Path
+import pytest
+from fha_scraper import FHAScraper
+from va_scraper import VAScraper
+from guideline_parser import matcher_for, find_requirements, split_pages, page_hash, StreamParser
+
+CORPUS_DIR = Path(__file__).resolve().parents[2] / "guidelines"
+
+CORPUS = [
+    (FHAScraper, "fha_handbook_4000.1.txt"),
+    (VAScraper, "va_lenders_handbook.txt"),
+    (VAScraper, "va_credit_underwriting.txt"),
+    (VAScraper, "va_m26_1_manual.txt"),
+]
+
+# Characters of each text fed to StreamParser at the smallest chunk sizes
+PREFIX_CHARS = 200_000
+
+
+def _text(name):
+    path = CORPUS_DIR / name
+    if not path.exists():
+        pytest.skip(f"{name} is not in the corpus")
+    return path.read_text(encoding='utf-8')
+
+
+def _per_pattern(text, category_patterns):
+    """find_requirements result built from scan_per_pattern"""
+    matcher = matcher_for(category_patterns)
+    found = {category: [] for category in category_patterns}
+    for (category, pattern_index, _), spans in zip(matcher.entries, matcher.scan_per_pattern(text)):
+        found[category].extend((pattern_index, start, end) for start, end in spans)
+    return found
+
+
+@pytest.mark.parametrize("scraper_class, name", CORPUS)
+def test_scan_matches_per_pattern(scraper_class, name):
+    text = _text(name)
+    matcher = matcher_for(scraper_class.category_patterns)
+    expected = matcher.scan_per_pattern(text)
+    assert matcher.scan(text) == expected
+    assert sum(map(len, expected)) > 0
+    # The prefilter is only worth having if it saves passes over the text
+    assert matcher.passes < len(matcher.entries)
+
+
+@pytest.mark.parametrize("scraper_class, name", CORPUS)
+def test_scan_window_matches_per_pattern(scraper_class, name):
+    text = _text(name)
+    matcher = matcher_for(scraper_class.category_patterns)
+    pos, endpos = len(text) // 3, 2 * len(text) // 3
+    accept_end = endpos - 1000
+    assert matcher.scan(text, pos, endpos, accept_end) == matcher.scan_per_pattern(text, pos, endpos, accept_end)
+
+
+@pytest.mark.parametrize("chunk", [97, 1000, 1 << 16])
+@pytest.mark.parametrize("scraper_class, name", CORPUS)
+def test_stream_parser_matches_whole_text(scraper_class, name, chunk):
+    text = _text(name)
+    if chunk < 1 << 16:
+        text = text[:PREFIX_CHARS]
+    stream = StreamParser(scraper_class.category_patterns)
+    for offset in range(0, len(text), chunk):
+        stream.feed(text[offset:offset + chunk])
+    pages, hashes = stream.close()
+    
+    assert pages == split_pages(text)
+    assert hashes == [page_hash(text[start:end]) for start, end in pages]
+    assert stream.requirements() == _per_pattern(text, scraper_class.category_patterns)
+    assert stream.requirements() == find_requirements(text, scraper_class.category_patterns)
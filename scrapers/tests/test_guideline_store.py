@@ -0,0 +1,147 @@
+"""Sharded text and the JSON index round-trip text, byte offsets and spans"""
+
+import io
+import mmap
+import contextlib
+import pytest
+import guideline_store
+from guideline_store import (
+    TextWriter, TextShards, save_guidelines, load_guidelines, load_index, index_shards,
+    prune_shards, export_index
+)
+from guideline_parser import update_requirements, iter_passages, requirement_keyword, REQUIREMENT_FORMAT
+
+PATTERNS = {
+    "income_requirements": [r"stable income"],
+    "credit_requirements": [r"credit score"],
+}
+
+# Multi-byte characters on every page, so byte and character offsets drift apart
+PAGE = (
+    "Café résumé – the borrower’s stable income must be verified ✓. "
+    "A minimum credit score of 580 applies to the loan. "
+    + "Naïve filler text about the property and its appraisal. " * 12
+)
+
+
+def _text(pages=40):
+    return "".join(f"\n--- PAGE {number} ---\n{PAGE}" for number in range(1, pages + 1))
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    """Shards and checkpoints a few KB apart, so short texts span several of each"""
+    monkeypatch.setattr(guideline_store, "SHARD_BYTES", 4096)
+    monkeypatch.setattr(guideline_store, "CHECKPOINT_CHARS", 256)
+
+
+def _write(json_file, text, chunk=1000):
+    writer = TextWriter(json_file)
+    for offset in range(0, len(text), chunk):
+        writer.write(text[offset:offset + chunk])
+    return writer.close()
+
+
+def _guidelines(tmp_path, text):
+    json_file = tmp_path / "test_guidelines.json"
+    with contextlib.redirect_stdout(io.StringIO()):
+        requirements, _, _ = update_requirements(text, PATTERNS, json_file, tmp_path / "test_page_index.json")
+    return json_file, {"source": "Test", "requirement_format": REQUIREMENT_FORMAT, "full_text": text, **requirements}
+
+
+def test_sharded_text_slices_and_offsets(tmp_path, small_shards):
+    text = _text()
+    sharded = _write(tmp_path / "test_guidelines.json", text)
+    try:
+        assert len(sharded.table["shards"]) > 1
+        assert len(sharded) == len(text)
+        assert sharded.table["bytes"] == len(text.encode('utf-8'))
+        for start, end in [(0, 10), (250, 900), (4000, 4100), (len(text) - 300, len(text)), (5, 5)]:
+            assert sharded[start:end] == text[start:end]
+        assert sharded[len(text) // 2] == text[len(text) // 2]
+        
+        offsets = list(range(0, len(text), 97)) + [len(text)]
+        byte_offsets = sharded.byte_offsets(offsets)
+        assert byte_offsets == [len(text[:offset].encode('utf-8')) for offset in offsets]
+        assert sharded.char_offsets(byte_offsets) == offsets
+    finally:
+        sharded.close()
+
+
+def test_text_shards_read_memory_mapped_ranges(tmp_path, small_shards):
+    text = _text()
+    data = text.encode('utf-8')
+    json_file = tmp_path / "test_guidelines.json"
+    table = _write(json_file, text).table
+    boundary = table["shards"][1]["start"]
+    
+    with TextShards(json_file, {"text": table}) as shards:
+        assert shards.read_bytes(0, len(data)) == data
+        assert shards.read_bytes(boundary - 50, boundary + 50) == data[boundary - 50:boundary + 50]
+        assert shards.read(boundary, boundary + 200) == data[boundary:boundary + 200].decode('utf-8')
+        assert shards.maps and all(isinstance(mapped, mmap.mmap) for mapped in shards.maps.values())
+
+
+def test_save_and_load_guidelines(tmp_path, small_shards):
+    text = _text()
+    json_file, guidelines = _guidelines(tmp_path, text)
+    save_guidelines(guidelines, json_file)
+    
+    index = load_index(json_file)
+    assert "full_text" not in index
+    assert index["offsets"] == "utf-8"
+    data = text.encode('utf-8')
+    span = guidelines["income_requirements"][-1]
+    stored = index["income_requirements"][-1]
+    assert data[stored["start"]:stored["end"]].decode('utf-8') == text[span["start"]:span["end"]]
+    
+    loaded = load_guidelines(json_file)
+    try:
+        assert loaded["full_text"][:] == text
+        for key in ["income_requirements", "credit_requirements", "passages"]:
+            assert loaded[key] == guidelines[key]
+        keywords = {requirement_keyword(loaded["full_text"], span) for span in loaded["credit_requirements"]}
+        assert keywords == {"credit score"}
+    finally:
+        loaded["full_text"].close()
+
+
+def test_prune_shards_keeps_what_is_read(tmp_path, small_shards):
+    text = _text()
+    json_file, guidelines = _guidelines(tmp_path, text)
+    save_guidelines(guidelines, json_file)
+    first = index_shards(json_file)
+    save_guidelines(guidelines, json_file)
+    second = index_shards(json_file)
+    assert first and second and not first & second
+    
+    assert prune_shards(json_file, keep=first) == 0
+    assert prune_shards(json_file) == len(first)
+    assert not any((tmp_path / name).exists() for name in first)
+    assert all((tmp_path / name).exists() for name in second)
+    loaded = load_guidelines(json_file)
+    assert loaded["full_text"][:] == text
+    loaded["full_text"].close()
+
+
+def test_export_index_records(tmp_path, small_shards):
+    text = _text()
+    json_file, guidelines = _guidelines(tmp_path, text)
+    save_guidelines(guidelines, json_file)
+    exported = export_index(json_file)
+    
+    expected = list(iter_passages(guidelines, "income_requirements"))
+    records = exported["income_requirements"]
+    assert records and len(records) == len(expected)
+    for record, passage in zip(records, expected):
+        assert set(record) == {"passage", "keyword", "keywords", "categories", "page"}
+        assert "income_requirements" in record["categories"]
+        assert (record["keyword"], record["keywords"], record["page"]) == (
+            passage["keyword"], passage["keywords"], passage["page"])
+    
+    # The passage text is read from the shards by the passage's byte range
+    index = load_index(json_file)
+    stored = index["passages"][records[0]["passage"]]
+    with TextShards(json_file, index) as shards:
+        assert shards.read(stored["start"], stored["end"]).strip() == expected[0]["context"]
+    assert exported["text"] == index["text"]
@@ -0,0 +1,93 @@
+"""The one-walk sectionizer gives the title, text and sections of a heading-by-heading BeautifulSoup pass"""
+
+import pytest
+import html_text
+from html_text import extract_page, lxml_available, HTML_HEADINGS
+
+PARSERS = [
+    "html.parser",
+    pytest.param("lxml", marks=pytest.mark.skipif(not lxml_available(), reason="lxml is not installed")),
+]
+
+PAGES = [
+    # Nested sections, inline markup and text between headings
+    """<html><head><title>Selling Guide</title></head><body><nav>Menu</nav><main>
+    <h1>B3-3 Income</h1><p>Intro <b>bold</b> text.</p>
+    <h2>Overtime</h2><p>Two year history.</p><ul><li>Verify</li><li>Average</li></ul>
+    <div><h3>Nested</h3><p>Inside a div.</p></div><p>After the div.</p>
+    <h4>Last</h4>Loose text<p>Tail paragraph.</p></main></body></html>""",
+    # Scripts, styles, comments and ruby text are not page text
+    """<html><head><title>Guide</title><style>p {}</style></head><body><article>
+    <h2>Rules<!-- hidden --></h2><script>var x = 1;</script><p>Visible<rt>note</rt></p>
+    <template><p>Template</p></template><h2>Empty</h2></article></body></html>""",
+    # div.content is the main area when there is no main or article
+    """<html><head><title>Freddie</title></head><body><div class="wide content">
+    <h1>Chapter 5301</h1><p>Stable income.</p><h2>5301.1</h2><table><tr><td>Cell</td></tr></table>
+    </div></body></html>""",
+    # No main area - the whole page is text and there are no sections
+    """<html><head><title>Plain</title></head><body><h1>Heading</h1><p>Body text.</p></body></html>""",
+]
+
+
+def _reference(content):
+    """extract_page as a find_next_siblings pass per heading, as it was before the walk"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    title = soup.title.string if soup.title else ''
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+    if not main_content:
+        return title, soup.get_text(separator='\n', strip=True), []
+    sections = []
+    for heading in main_content.find_all(HTML_HEADINGS):
+        content_parts = []
+        for sibling in heading.find_next_siblings():
+            if sibling.name in HTML_HEADINGS:
+                break
+            content_parts.append(sibling.get_text(strip=True))
+        sections.append({
+            'heading': heading.get_text(strip=True),
+            'level': heading.name,
+            'content': '\n'.join(content_parts)
+        })
+    return title, main_content.get_text(separator='\n', strip=True), sections
+
+
+@pytest.fixture
+def parser(request):
+    """HTML parser configured for the test, then restored"""
+    options = html_text.html_options()
+    html_text.configure_html(parser=request.param)
+    yield request.param
+    html_text.configure_html(**options)
+
+
+@pytest.mark.parametrize("parser", PARSERS, indirect=True)
+@pytest.mark.parametrize("page", PAGES)
+def test_extract_page_matches_reference(parser, page):
+    assert extract_page(page) == _reference(page)
+    assert extract_page(page.encode('utf-8')) == _reference(page.encode('utf-8'))
+
+
+@pytest.mark.parametrize("parser", PARSERS, indirect=True)
+def test_long_page_sections(parser):
+    page = "<main>" + "".join(
+        f"<h2>Section {number}</h2><p>Rule {number}.</p><p>Detail {number}.</p>" for number in range(500)
+    ) + "</main>"
+    title, text, sections = extract_page(page)
+    assert (title, text, sections) == _reference(page)
+    assert len(sections) == 500
+    assert sections[-1] == {'heading': 'Section 499', 'level': 'h2', 'content': 'Rule 499.\nDetail 499.'}
+
+
+def test_parsers_repair_headings_differently():
+    # html.parser keeps the <p> inside the heading; lxml closes the heading before it
+    page = "<main><h2>A<p>inside</p></h2><p>after</p></main>"
+    options = html_text.html_options()
+    try:
+        html_text.configure_html(parser="html.parser")
+        assert extract_page(page)[2] == [{'heading': 'Ainside', 'level': 'h2', 'content': 'after'}]
+        if lxml_available():
+            html_text.configure_html(parser="lxml")
+            assert extract_page(page)[2] == [{'heading': 'A', 'level': 'h2', 'content': 'inside\nafter'}]
+    finally:
+        html_text.configure_html(**options)
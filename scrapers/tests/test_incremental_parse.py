@@ -0,0 +1,92 @@
+"""An --incremental parse after a one-page edit against a full parse of the edited text"""
+
+import io
+import shutil
+import contextlib
+from pathlib import Path
+import pytest
+import guideline_json
+from va_scraper import VAScraper
+from guideline_pipeline import Extracted
+from guideline_parser import split_pages, INDEX_VERSION
+
+CORPUS_DIR = Path(__file__).resolve().parents[2] / "guidelines"
+
+# Page of va_lenders_handbook.txt the edit goes on - one that opens with
+# income matches, whose context the edit changes - and what it inserts there
+EDITED_PAGE = 131
+INSERTED = "Overtime and bonus income count as qualifying income once verified. "
+
+
+def _extracted(text_dir):
+    return [
+        Extracted(document.name, document.urls[0], None, text_dir / Path(document.filename).with_suffix('.txt'),
+                  None, [])
+        for document in VAScraper.documents
+    ]
+
+
+def _parse(scraper, extracted, incremental=False):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scraper.parse_guidelines(extracted, incremental=incremental)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Copy of the VA text files, one of which the test edits"""
+    text_dir = tmp_path / "text"
+    text_dir.mkdir()
+    for document in VAScraper.documents:
+        text_file = CORPUS_DIR / Path(document.filename).with_suffix('.txt')
+        if not text_file.exists():
+            pytest.skip(f"{text_file.name} is not in the corpus")
+        shutil.copy(text_file, text_dir)
+    return text_dir
+
+
+def test_incremental_matches_full_parse(tmp_path, corpus):
+    scraper = VAScraper(data_dir=str(tmp_path / "incremental"))
+    before = _parse(scraper, _extracted(corpus))
+    with contextlib.redirect_stdout(io.StringIO()):
+        scraper.persist(before)
+    
+    # Insert a sentence with new matches near the start of one page
+    handbook = corpus / "va_lenders_handbook.txt"
+    text = handbook.read_text(encoding='utf-8')
+    marker = f"--- PAGE {EDITED_PAGE} ---\n"
+    assert marker in text
+    handbook.write_text(text.replace(marker, marker + INSERTED, 1), encoding='utf-8')
+    
+    incremental = _parse(scraper, _extracted(corpus), incremental=True)
+    page_index, changes = scraper.parse_records
+    full = _parse(VAScraper(data_dir=str(tmp_path / "full")), _extracted(corpus))
+    
+    assert changes["mode"] == "incremental"
+    assert 0 < changes["pages"]["reparsed"] < changes["pages"]["total"] // 10
+    for category in VAScraper.category_patterns:
+        assert incremental[category] == full[category], category
+    assert incremental["passages"] == full["passages"]
+    
+    # The page index describes the new text and is stamped with its shards
+    with contextlib.redirect_stdout(io.StringIO()):
+        scraper.persist(incremental)
+    saved_index = guideline_json.load(scraper.page_index_file)
+    assert saved_index == page_index
+    assert saved_index["version"] == INDEX_VERSION
+    assert saved_index["generation"] == incremental["full_text"].table["generation"]
+    assert len(saved_index["pages"]) == len(split_pages(incremental["full_text"][:]))
+    for category in VAScraper.category_patterns:
+        assert len(saved_index["entries"][category]) == len(full[category])
+    
+    # The change log has the inserted matches, and entries whose context the
+    # insertion changed as removed (with their old context) and re-added
+    saved_changes = guideline_json.load(scraper.changes_file)
+    assert saved_changes["mode"] == "incremental"
+    added = saved_changes["categories"]["income_requirements"]["added"]
+    removed = saved_changes["categories"]["income_requirements"]["removed"]
+    assert {"Overtime", "bonus", "qualifying income"} <= {entry["keyword"] for entry in added}
+    assert all("context" not in entry and len(entry["context_digest"]) == 16 for entry in added)
+    assert removed
+    assert all(entry["context"] and entry["context"] not in incremental["full_text"][:] for entry in removed)
+    for entry in added:
+        assert incremental["full_text"][entry["start"]:entry["end"]] == entry["keyword"]
@@ -4,281 +4,75 @@ USDA Guideline Scraper
 Downloads and parses HB-1-3555 Single Family Housing Guaranteed Loan Program Handbook
 """
 
-import requests
-import json
-import hashlib
-import os
-from datetime import datetime
-from pathlib import Path
-import PyPDF2
-import re
+import argparse
+from guideline_pipeline import GuidelinePipeline, Document, add_scrape_arguments
+from scrape_profile import configure_profiling, add_profile_arguments, profile_options
 
-class USDAScraper:
-    def __init__(self, data_dir="../guidelines"):
-        self.data_dir = Path(data_dir)
-        self.data_dir.mkdir(parents=True, exist_ok=True)
-        
-        self.sources = {
-            "hb_1_3555": "https://www.rd.usda.gov/media/file/download/hb-1-3555-consolidated.pdf",
-            "hb_1_3550": "https://www.rd.usda.gov/media/file/download/hb-1-3550-consolidated.pdf"
-        }
-        
-        self.metadata_file = self.data_dir / "usda_metadata.json"
-        self.json_file = self.data_dir / "usda_guidelines.json"
+class USDAScraper(GuidelinePipeline):
+    key = "usda"
+    name = "USDA"
+    source = "USDA - HB-1-3555 Single Family Housing Guaranteed Loan Program"
     
-    def download_pdf(self, url, filename):
-        """Download PDF from URL"""
-        filepath = self.data_dir / filename
-        print(f"Downloading USDA document from {url}...")
-        try:
-            response = requests.get(url, timeout=180, stream=True)
-            response.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            print(f"Downloaded successfully to {filepath}")
-            return filepath
-        except Exception as e:
-            print(f"Error downloading from {url}: {e}")
-            return None
+    documents = [
+        Document("hb_1_3555", "pdf", [
+            "https://www.rd.usda.gov/media/file/download/hb-1-3555-consolidated.pdf"
+        ], "usda_hb_1_3555.pdf"),
+        Document("hb_1_3550", "pdf", [
+            "https://www.rd.usda.gov/media/file/download/hb-1-3550-consolidated.pdf"
+        ], "usda_hb_1_3550.pdf"),
+    ]
+    separator = "\n\n=== DOCUMENT SEPARATOR ===\n\n"
     
-    def calculate_hash(self, filepath):
-        """Calculate SHA256 hash of file"""
-        sha256_hash = hashlib.sha256()
-        with open(filepath, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+    fields = ["documents", "income_requirements", "credit_requirements", "property_requirements",
+              "debt_to_income_ratios", "eligibility_requirements", "geographic_requirements"]
     
-    def extract_text_from_pdf(self, filepath):
-        """Extract text content from PDF"""
-        print(f"Extracting text from {filepath.name}...")
-        try:
-            text_content = []
-            
-            with open(filepath, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                total_pages = len(pdf_reader.pages)
-                
-                print(f"Total pages: {total_pages}")
-                
-                for page_num in range(total_pages):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    text_content.append(f"\n--- PAGE {page_num + 1} ---\n{text}")
-                    
-                    if (page_num + 1) % 50 == 0:
-                        print(f"Processed {page_num + 1}/{total_pages} pages...")
-            
-            full_text = "\n".join(text_content)
-            
-            # Save extracted text
-            text_file = filepath.with_suffix('.txt')
-            with open(text_file, 'w', encoding='utf-8') as f:
-                f.write(full_text)
-            
-            print(f"Text extracted and saved to {text_file}")
-            return full_text
-        
-        except Exception as e:
-            print(f"Error extracting text: {e}")
-            return None
-    
-    def parse_guidelines(self, texts):
-        """Parse guidelines into structured format"""
-        print("Parsing USDA guidelines into structured format...")
-        
-        # Combine all texts
-        combined_text = "\n\n=== DOCUMENT SEPARATOR ===\n\n".join(texts.values())
-        
-        guidelines = {
-            "source": "USDA - HB-1-3555 Single Family Housing Guaranteed Loan Program",
-            "last_updated": datetime.now().isoformat(),
-            "documents": list(texts.keys()),
-            "income_requirements": [],
-            "credit_requirements": [],
-            "property_requirements": [],
-            "debt_to_income_ratios": [],
-            "eligibility_requirements": [],
-            "geographic_requirements": [],
-            "full_text": combined_text
-        }
-        
-        # Extract key sections using regex patterns
-        income_patterns = [
+    category_patterns = {
+        "income_requirements": [
             r"(?i)(income\s+calculation|qualifying\s+income|household\s+income)",
             r"(?i)(adjusted\s+annual\s+income|annual\s+income)",
             r"(?i)(self-employed\s+income|business\s+income)",
             r"(?i)(income\s+eligibility|income\s+limits)",
-        ]
-        
-        credit_patterns = [
+        ],
+        "credit_requirements": [
             r"(?i)(credit\s+score|credit\s+requirements|credit\s+history)",
             r"(?i)(credit\s+report|credit\s+analysis)",
             r"(?i)(bankruptcy|foreclosure)",
-        ]
-        
-        dti_patterns = [
+        ],
+        "debt_to_income_ratios": [
             r"(?i)(debt.to.income|dti\s+ratio|housing\s+ratio)",
             r"(?i)(piti\s+ratio|total\s+debt\s+ratio)",
-        ]
-        
-        eligibility_patterns = [
+        ],
+        "eligibility_requirements": [
             r"(?i)(borrower\s+eligibility|applicant\s+eligibility)",
             r"(?i)(income\s+eligibility|area\s+eligibility)",
             r"(?i)(citizenship\s+requirements|residency\s+requirements)",
-        ]
-        
-        geographic_patterns = [
+        ],
+        "geographic_requirements": [
             r"(?i)(rural\s+area|eligible\s+area|rural\s+designation)",
             r"(?i)(property\s+location|geographic\s+eligibility)",
-        ]
-        
-        # Extract income requirements
-        for pattern in income_patterns:
-            matches = re.finditer(pattern, combined_text)
-            for match in matches:
-                start = max(0, match.start() - 500)
-                end = min(len(combined_text), match.end() + 500)
-                context = combined_text[start:end].strip()
-                guidelines["income_requirements"].append({
-                    "keyword": match.group(),
-                    "context": context
-                })
-        
-        # Extract credit requirements
-        for pattern in credit_patterns:
-            matches = re.finditer(pattern, combined_text)
-            for match in matches:
-                start = max(0, match.start() - 500)
-                end = min(len(combined_text), match.end() + 500)
-                context = combined_text[start:end].strip()
-                guidelines["credit_requirements"].append({
-                    "keyword": match.group(),
-                    "context": context
-                })
-        
-        # Extract DTI requirements
-        for pattern in dti_patterns:
-            matches = re.finditer(pattern, combined_text)
-            for match in matches:
-                start = max(0, match.start() - 500)
-                end = min(len(combined_text), match.end() + 500)
-                context = combined_text[start:end].strip()
-                guidelines["debt_to_income_ratios"].append({
-                    "keyword": match.group(),
-                    "context": context
-                })
-        
-        # Extract eligibility requirements
-        for pattern in eligibility_patterns:
-            matches = re.finditer(pattern, combined_text)
-            for match in matches:
-                start = max(0, match.start() - 500)
-                end = min(len(combined_text), match.end() + 500)
-                context = combined_text[start:end].strip()
-                guidelines["eligibility_requirements"].append({
-                    "keyword": match.group(),
-                    "context": context
-                })
-        
-        # Extract geographic requirements
-        for pattern in geographic_patterns:
-            matches = re.finditer(pattern, combined_text)
-            for match in matches:
-                start = max(0, match.start() - 500)
-                end = min(len(combined_text), match.end() + 500)
-                context = combined_text[start:end].strip()
-                guidelines["geographic_requirements"].append({
-                    "keyword": match.group(),
-                    "context": context
-                })
-        
-        print(f"Found {len(guidelines['income_requirements'])} income requirement sections")
-        print(f"Found {len(guidelines['credit_requirements'])} credit requirement sections")
-        print(f"Found {len(guidelines['debt_to_income_ratios'])} DTI requirement sections")
-        print(f"Found {len(guidelines['eligibility_requirements'])} eligibility requirement sections")
-        print(f"Found {len(guidelines['geographic_requirements'])} geographic requirement sections")
-        
-        return guidelines
-    
-    def save_metadata(self, file_hashes):
-        """Save metadata about the downloaded files"""
-        metadata = {
-            "last_checked": datetime.now().isoformat(),
-            "file_hashes": file_hashes,
-            "sources": self.sources
-        }
-        
-        with open(self.metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        print(f"Metadata saved to {self.metadata_file}")
+        ],
+    }
+    category_labels = {
+        "income_requirements": "income",
+        "credit_requirements": "credit",
+        "debt_to_income_ratios": "DTI",
+        "eligibility_requirements": "eligibility",
+        "geographic_requirements": "geographic"
+    }
     
-    def scrape(self, force_update=False):
-        """Main scraping function"""
-        print("=" * 60)
-        print("USDA Guideline Scraper")
-        print("=" * 60)
-        
-        # Check if we should use cached data
-        if not force_update and self.json_file.exists():
-            print("Using existing USDA guidelines data.")
-            with open(self.json_file, 'r') as f:
-                return json.load(f)
-        
-        # Download all PDFs
-        downloaded_files = {}
-        file_hashes = {}
-        
-        for doc_name, url in self.sources.items():
-            filename = f"usda_{doc_name}.pdf"
-            filepath = self.download_pdf(url, filename)
-            
-            if filepath:
-                downloaded_files[doc_name] = filepath
-                file_hashes[doc_name] = self.calculate_hash(filepath)
-            else:
-                print(f"Warning: Failed to download {doc_name}")
-        
-        if not downloaded_files:
-            print("Failed to download any USDA documents.")
-            return None
-        
-        # Save metadata
-        self.save_metadata(file_hashes)
-        
-        # Extract text from all PDFs
-        texts = {}
-        for doc_name, filepath in downloaded_files.items():
-            text = self.extract_text_from_pdf(filepath)
-            if text:
-                texts[doc_name] = text
-        
-        if not texts:
-            print("Failed to extract text from any USDA documents.")
-            return None
-        
-        # Parse guidelines
-        guidelines = self.parse_guidelines(texts)
-        
-        # Save structured data
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump(guidelines, f, indent=2, ensure_ascii=False)
-        
-        print(f"Structured guidelines saved to {self.json_file}")
-        print("=" * 60)
-        print("USDA scraping completed successfully!")
-        print("=" * 60)
-        
-        return guidelines
+    # USDA's consolidated handbooks are large and slow to serve
+    timeout = 180
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape USDA guidelines")
+    add_scrape_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_profiling(**profile_options(args))
+    
     scraper = USDAScraper()
-    guidelines = scraper.scrape()
+    guidelines = scraper.scrape(force_update=args.force, max_age=args.max_age)
     
     if guidelines:
         print(f"\nSummary:")
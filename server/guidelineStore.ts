@@ -0,0 +1,244 @@
+/**
+ * Guideline Store - Read the scraped guideline index and its text shards
+ * The combined index is small; passage text is read from UTF-8 shard files by byte range on demand
+ * Relevant passages are ranked by the BM25 retriever in scrapers/guideline_db.py
+ * Files the scrapers wrote with --compress (gzip, or zstd on Node versions with zlib zstd support) are read transparently
+ */
+
+import * as fs from "fs";
+import * as path from "path";
+import * as zlib from "zlib";
+import * as readline from "readline";
+import { spawn, type ChildProcess } from "child_process";
+
+export interface TextShard {
+  file: string;
+  start: number;
+  end: number;
+}
+
+export interface Passage {
+  start: number;
+  end: number;
+  page: number;
+  categories: string[];
+}
+
+export interface RequirementRecord {
+  keyword: string;
+  keywords?: string[];
+  context: string;
+  categories?: string[];
+  page?: number;
+}
+
+export interface CombinedGuidelines {
+  metadata: Record<string, any>;
+  guidelines: Record<string, any>;
+  dir: string;
+  file: string;
+  mtimeMs: number;
+}
+
+const GZIP_MAGIC = Buffer.from([0x1f, 0x8b]);
+const ZSTD_MAGIC = Buffer.from([0x28, 0xb5, 0x2f, 0xfd]);
+
+/**
+ * Codec a file was compressed with, from its leading bytes - null for a plain file
+ */
+function compressionOf(data: Buffer): "gzip" | "zstd" | null {
+  if (data.subarray(0, GZIP_MAGIC.length).equals(GZIP_MAGIC)) return "gzip";
+  if (data.subarray(0, ZSTD_MAGIC.length).equals(ZSTD_MAGIC)) return "zstd";
+  return null;
+}
+
+/**
+ * Contents of a file the scrapers wrote, decompressed if it is compressed
+ */
+function decompress(data: Buffer, filePath: string): Buffer {
+  const codec = compressionOf(data);
+  if (codec === "gzip") return zlib.gunzipSync(data);
+  if (codec === "zstd") {
+    const zstdDecompressSync = (zlib as any).zstdDecompressSync;
+    if (!zstdDecompressSync) {
+      throw new Error(`${filePath} is zstd-compressed, which this Node version cannot read - rescrape with --compress gzip`);
+    }
+    return zstdDecompressSync(data);
+  }
+  return data;
+}
+
+/**
+ * Load combined_guidelines.json - text shards are resolved relative to its directory
+ */
+export function loadCombinedGuidelines(filePath: string): CombinedGuidelines {
+  const { mtimeMs } = fs.statSync(filePath);
+  const data = JSON.parse(decompress(fs.readFileSync(filePath), filePath).toString("utf8"));
+  return { ...data, dir: path.dirname(filePath), file: filePath, mtimeMs };
+}
+
+/**
+ * Reload the combined file in place if a scraper run has replaced it since it was loaded
+ * Old shard generations are deleted once the new combined file is written, so stale indexes must not outlive it
+ */
+export function refreshCombinedGuidelines(combined: CombinedGuidelines): CombinedGuidelines {
+  try {
+    if (fs.statSync(combined.file).mtimeMs !== combined.mtimeMs) {
+      Object.assign(combined, loadCombinedGuidelines(combined.file));
+    }
+  } catch (error) {
+    console.warn("[Guidelines] Could not reload combined guidelines:", error);
+  }
+  return combined;
+}
+
+// Compressed shards are decompressed whole once; the mtime notices a rescrape
+const decompressedShards = new Map<string, { mtimeMs: number; data: Buffer }>();
+
+/**
+ * Bytes [from, to) of one shard - read in place, or from its decompressed copy
+ */
+function readShard(file: string, from: number, to: number): Buffer {
+  const fd = fs.openSync(file, "r");
+  try {
+    const magic = Buffer.alloc(ZSTD_MAGIC.length);
+    fs.readSync(fd, magic, 0, magic.length, 0);
+    if (!compressionOf(magic)) {
+      const buffer = Buffer.alloc(to - from);
+      fs.readSync(fd, buffer, 0, buffer.length, from);
+      return buffer;
+    }
+    const { mtimeMs } = fs.fstatSync(fd);
+    let cached = decompressedShards.get(file);
+    if (!cached || cached.mtimeMs !== mtimeMs) {
+      cached = { mtimeMs, data: decompress(fs.readFileSync(file), file) };
+      decompressedShards.set(file, cached);
+    }
+    return cached.data.subarray(from, to);
+  } finally {
+    fs.closeSync(fd);
+  }
+}
+
+/**
+ * Read bytes [start, end) of an agency's concatenated text shards
+ */
+function readText(dir: string, shards: TextShard[], start: number, end: number): string {
+  const pieces: Buffer[] = [];
+  for (const shard of shards) {
+    if (shard.end <= start || shard.start >= end) continue;
+    const from = Math.max(start, shard.start);
+    const to = Math.min(end, shard.end);
+    pieces.push(readShard(path.join(dir, shard.file), from - shard.start, to - shard.start));
+  }
+  return Buffer.concat(pieces).toString("utf8");
+}
+
+/**
+ * First `limit` requirement records of a category, with passage text read from the shards
+ * Records from files that still embed their context are returned as stored
+ */
+export function requirementRecords(
+  combined: CombinedGuidelines,
+  guidelines: any,
+  category: string,
+  limit: number
+): RequirementRecord[] {
+  const entries: any[] = guidelines?.[category]?.slice(0, limit) || [];
+  return entries.map((entry) => {
+    if (entry.passage === undefined || !guidelines.text) return entry;
+    const passage: Passage = guidelines.passages[entry.passage];
+    return {
+      keyword: entry.keyword,
+      keywords: entry.keywords,
+      context: readText(combined.dir, guidelines.text.shards, passage.start, passage.end).trim(),
+      categories: entry.categories,
+      page: entry.page,
+    };
+  });
+}
+
+// Give up on the retriever and fall back to document order after this long
+const RETRIEVAL_TIMEOUT_MS = 2000;
+
+let retriever: ChildProcess | null = null;
+const pendingReplies: Array<(reply: any) => void> = [];
+
+/**
+ * Long-lived `guideline_db.py serve` process answering one JSON request per line
+ */
+function getRetriever(dir: string): ChildProcess {
+  if (retriever && retriever.exitCode === null) return retriever;
+
+  const scraperDir = path.join(dir, "..", "scrapers");
+  const child = spawn("python3", ["guideline_db.py", "--db", path.join(dir, "guidelines.db"), "serve"], {
+    cwd: scraperDir,
+    stdio: ["pipe", "pipe", "inherit"],
+  });
+  readline.createInterface({ input: child.stdout! }).on("line", (line) => {
+    const resolve = pendingReplies.shift();
+    if (!resolve) return;
+    try {
+      resolve(JSON.parse(line));
+    } catch {
+      resolve({ error: "Malformed retriever reply" });
+    }
+  });
+  const failPending = () => {
+    retriever = null;
+    while (pendingReplies.length) pendingReplies.shift()!({ error: "Retriever exited" });
+  };
+  child.on("exit", failPending);
+  child.on("error", failPending);
+  child.stdin!.on("error", failPending);
+  retriever = child;
+  return child;
+}
+
+function askRetriever(dir: string, request: Record<string, any>): Promise<any> {
+  return new Promise((resolve) => {
+    let settled = false;
+    const settle = (reply: any) => {
+      if (settled) return;
+      settled = true;
+      resolve(reply);
+    };
+    const timer = setTimeout(() => settle({ error: "Retriever timed out" }), RETRIEVAL_TIMEOUT_MS);
+    pendingReplies.push((reply) => {
+      clearTimeout(timer);
+      settle(reply);
+    });
+    getRetriever(dir).stdin!.write(JSON.stringify(request) + "\n");
+  });
+}
+
+/**
+ * Top `limit` requirement records of a category ranked by BM25 relevance to `query`
+ * Falls back to the first records in document order when the retriever is unavailable or finds nothing
+ */
+export async function retrieveRequirements(
+  combined: CombinedGuidelines,
+  sourceKey: string,
+  category: string,
+  query: string,
+  limit: number
+): Promise<RequirementRecord[]> {
+  if (combined) refreshCombinedGuidelines(combined);
+  const guidelines = combined?.guidelines?.[sourceKey];
+  try {
+    const reply = await askRetriever(combined.dir, { query, source: sourceKey, category, k: limit });
+    if (reply.passages && reply.passages.length > 0) {
+      return reply.passages.map((passage: any) => ({
+        keyword: passage.keywords[0],
+        keywords: passage.keywords,
+        context: passage.text,
+        categories: passage.categories,
+        page: passage.page,
+      }));
+    }
+    if (reply.error) console.warn("[Guidelines] Retrieval failed:", reply.error);
+  } catch (error) {
+    console.warn("[Guidelines] Retrieval failed:", error);
+  }
+  return requirementRecords(combined, guidelines, category, limit);
+}
@@ -6,17 +6,17 @@ import { z } from "zod";
 import * as db from "./db";
 import { storagePut } from "./storage";
 import { invokeLLM } from "./_core/llm";
-import { readFileSync } from "fs";
 import { join } from "path";
 import { performOCR, batchOCR, calculateTotalIncome, type OCRResult } from "./ocr";
 import { ocrRouter } from "./ocrRouter";
 import { generateProfessionalReport } from "./reportGenerator";
+import { loadCombinedGuidelines, retrieveRequirements } from "./guidelineStore";
 
 // Load guideline data
 let guidelineData: any = null;
 try {
   const guidelinePath = join(process.cwd(), "guidelines", "combined_guidelines.json");
-  guidelineData = JSON.parse(readFileSync(guidelinePath, "utf-8"));
+  guidelineData = loadCombinedGuidelines(guidelinePath);
 } catch (error) {
   console.warn("Could not load guideline data:", error);
 }
@@ -211,17 +211,30 @@ export const appRouter = router({
           const guidelines = guidelineData.guidelines[sourceKey];
           
           if (guidelines) {
+            // Rank rules by the income types this borrower actually has
+            const incomeTypes = [
+              input.overtimeIncome && "overtime",
+              input.bonusIncome && "bonus",
+              input.commissionIncome && "commission",
+              input.rentalIncome && "rental income",
+              input.businessIncome && "self-employed business income",
+              input.otherIncome && "other income",
+            ].filter(Boolean);
+            const query = `${input.loanType} qualifying income ${incomeTypes.join(" ")}`;
+            const incomeRules = await retrieveRequirements(guidelineData, sourceKey, "income_requirements", query, 5);
+            const dtiRules = await retrieveRequirements(guidelineData, sourceKey, "debt_to_income_ratios", query, 3);
+
             guidelineContext = `
 Relevant ${input.loanType} Guidelines:
 - Income Requirements: ${guidelines.income_requirements?.length || 0} rules
 - Credit Requirements: ${guidelines.credit_requirements?.length || 0} rules
 - DTI Requirements: ${guidelines.debt_to_income_ratios?.length || 0} rules
 
-Sample Income Guidelines:
-${JSON.stringify(guidelines.income_requirements?.slice(0, 5) || [], null, 2)}
+Relevant Income Guidelines:
+${JSON.stringify(incomeRules, null, 2)}
 
-Sample DTI Guidelines:
-${JSON.stringify(guidelines.debt_to_income_ratios?.slice(0, 3) || [], null, 2)}
+Relevant DTI Guidelines:
+${JSON.stringify(dtiRules, null, 2)}
 `;
           }
         }
@@ -5,15 +5,14 @@ import { z } from "zod";
 import { protectedProcedure } from "./_core/trpc";
 import { invokeLLM } from "./_core/llm";
 import * as db from "./db";
-import * as fs from "fs";
 import * as path from "path";
+import { loadCombinedGuidelines, retrieveRequirements } from "./guidelineStore";
 
 // Load guideline data
 let guidelineData: any = null;
 try {
   const guidelinePath = path.join(__dirname, "../guidelines/combined_guidelines.json");
-  const data = fs.readFileSync(guidelinePath, "utf-8");
-  guidelineData = JSON.parse(data);
+  guidelineData = loadCombinedGuidelines(guidelinePath);
   console.log("[Guidelines] Loaded combined guidelines successfully");
 } catch (error) {
   console.error("[Guidelines] Could not load guideline data:", error);
@@ -58,17 +57,22 @@ export const calculateMultiGuideline = protectedProcedure
           const source = guidelines.source || loanType.name;
           citations.push(`${source} - Last Updated: ${guidelines.last_updated || "N/A"}`);
 
+          // Rules most relevant to the borrower's documents, not just the first in the handbook
+          const query = `${loanType.name} ${input.documentNames.join(" ")}`;
+          const incomeRules = await retrieveRequirements(guidelineData, loanType.key, "income_requirements", query, 10);
+          const dtiRules = await retrieveRequirements(guidelineData, loanType.key, "debt_to_income_ratios", query, 5);
+
           guidelineContext = `
 Relevant ${loanType.name} Guidelines:
 Source: ${source}
 - Income Requirements: ${guidelines.income_requirements?.length || 0} rules
 - Credit Requirements: ${guidelines.credit_requirements?.length || 0} rules
 
-Sample Income Guidelines:
-${JSON.stringify(guidelines.income_requirements?.slice(0, 10) || [], null, 2)}
+Relevant Income Guidelines:
+${JSON.stringify(incomeRules, null, 2)}
 
-Sample DTI Guidelines:
-${JSON.stringify(guidelines.debt_to_income_ratios?.slice(0, 5) || [], null, 2)}
+Relevant DTI Guidelines:
+${JSON.stringify(dtiRules, null, 2)}
 `;
 
           // Add specific citations